@@ -0,0 +1,408 @@
+import os
+import sys
+import json
+import time
+import re
+import random
+import zipfile
+import argparse
+import platform
+import statistics
+import shutil
+import textwrap
+import subprocess
+
+from storage import data_dir
+
+# Замер скорости поиска на воспроизводимых синтетических наборах файлов.
+# Каждый замер выполняется в отдельном процессе (чтобы пиковая память не
+# накапливалась между замерами), результаты выводятся в формате JSON Lines:
+#
+#   python benchmark.py run -o before.jsonl
+#   python benchmark.py run -o after.jsonl
+#   python benchmark.py compare before.jsonl after.jsonl
+
+# Версия генератора: при изменении наборы файлов создаются заново
+CORPUS_VERSION = 1
+CORPUS_MARKER = ".benchmark.json"
+
+NEEDLE = "benchneedle"
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua договор счёт отчёт поставка оплата "
+    "invoice report contract delivery payment quarterly annual budget"
+).split()
+
+# Профиль -> расширения для поиска
+PROFILES = {
+    "tiny": ".txt, .log",
+    "huge": ".txt",
+    "deep": ".txt, .md",
+    "binary": ".txt, .dat",
+    "office": ".docx, .xlsx, .pptx, .pdf",
+}
+
+# Вариант запроса -> (ключевые слова, тип совпадения)
+CASES = {
+    "needle": (NEEDLE, "any"),
+    "all": (f"{NEEDLE}, invoice", "all"),
+    "miss": ("zzqqxxnotfound", "any"),
+}
+
+
+def make_text(rng, size, needle=False):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    if needle:
+        words.insert(rng.randrange(len(words) + 1), NEEDLE)
+    return " ".join(words)
+
+
+def write_text(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def gen_tiny(rng, root, scale):
+    # Много маленьких файлов в плоских папках
+    for i in range(int(20000 * scale)):
+        ext = ".txt" if i % 4 else ".log"
+        path = os.path.join(root, f"d{i % 200:03d}", f"f{i:06d}{ext}")
+        write_text(path, make_text(rng, rng.randint(100, 2000), rng.random() < 0.01))
+
+
+def gen_huge(rng, root, scale):
+    # Несколько больших файлов; искомое слово - ближе к концу одного из них
+    block = make_text(rng, 1024 * 1024)
+    for i in range(4):
+        path = os.path.join(root, f"huge{i}.txt")
+        blocks = max(int(48 * scale), 1)
+        with open(path, 'w', encoding='utf-8') as f:
+            for b in range(blocks):
+                f.write(block)
+                if i == 0 and b == blocks - 2:
+                    f.write(f" {NEEDLE} ")
+
+
+def gen_deep(rng, root, scale):
+    # Глубокая вложенность: цепочки папок глубиной до 40 уровней
+    for chain in range(int(60 * scale)):
+        path = root
+        for depth in range(rng.randint(10, 40)):
+            path = os.path.join(path, f"c{chain}_{depth}")
+            for i in range(rng.randint(0, 3)):
+                ext = ".txt" if i % 2 else ".md"
+                write_text(os.path.join(path, f"n{i}{ext}"),
+                           make_text(rng, rng.randint(200, 4000), rng.random() < 0.05))
+
+
+def gen_binary(rng, root, scale):
+    # Смесь текстовых и бинарных файлов с текстовыми расширениями
+    for i in range(int(3000 * scale)):
+        ext = ".txt" if i % 3 else ".dat"
+        path = os.path.join(root, f"b{i % 30:02d}", f"m{i:05d}{ext}")
+        if i % 2:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(rng.randbytes(rng.randint(1024, 256 * 1024)))
+        else:
+            write_text(path, make_text(rng, rng.randint(1024, 64 * 1024), rng.random() < 0.02))
+
+
+def xml_escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def write_ooxml(path, parts):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8"?><Types/>')
+        for name, xml in parts.items():
+            archive.writestr(name, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>' + xml)
+
+
+def write_docx(path, paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{xml_escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    write_ooxml(path, {"word/document.xml": f"<w:document><w:body>{body}</w:body></w:document>"})
+
+
+def write_xlsx(path, paragraphs):
+    strings = "".join(f"<si><t>{xml_escape(p)}</t></si>" for p in paragraphs)
+    write_ooxml(path, {"xl/sharedStrings.xml": f"<sst>{strings}</sst>"})
+
+
+def write_pptx(path, paragraphs):
+    parts = {}
+    for i, p in enumerate(paragraphs, 1):
+        parts[f"ppt/slides/slide{i}.xml"] = f"<p:sld><a:p><a:r><a:t>{xml_escape(p)}</a:t></a:r></a:p></p:sld>"
+    write_ooxml(path, parts)
+
+
+def write_pdf(path, pages):
+    # Минимальный PDF: страницы с текстом шрифтом Helvetica (только ASCII)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        text = text.encode('ascii', 'ignore').decode('ascii')
+        lines = [line.encode('ascii') for line in textwrap.wrap(re.sub(r'[\\()]', '', text), 80)]
+        content = b"BT /F1 10 Tf 40 800 Td 12 TL " + b" ".join(b"(" + line + b") '" for line in lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def gen_office(rng, root, scale):
+    # Документы DOCX/XLSX/PPTX/PDF
+    writers = [(".docx", write_docx), (".xlsx", write_xlsx), (".pptx", write_pptx), (".pdf", write_pdf)]
+    for i in range(int(800 * scale)):
+        ext, writer = writers[i % len(writers)]
+        path = os.path.join(root, f"o{i % 20:02d}", f"doc{i:05d}{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        count = rng.randint(1, 20)
+        needle_at = rng.randrange(count) if rng.random() < 0.05 else -1
+        writer(path, [make_text(rng, rng.randint(200, 3000), n == needle_at) for n in range(count)])
+
+
+GENERATORS = {
+    "tiny": gen_tiny,
+    "huge": gen_huge,
+    "deep": gen_deep,
+    "binary": gen_binary,
+    "office": gen_office,
+}
+
+
+def ensure_corpus(base, profile, scale, seed):
+    # Набор создаётся один раз и переиспользуется, пока совпадают параметры
+    spec = {"version": CORPUS_VERSION, "profile": profile, "scale": scale, "seed": seed}
+    root = os.path.join(base, f"{profile}-{scale:g}-{seed}")
+    marker = os.path.join(root, CORPUS_MARKER)
+    try:
+        with open(marker, encoding='utf-8') as f:
+            if json.load(f) == spec:
+                return root
+    except (OSError, ValueError):
+        pass
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+    print(f"Создание набора {profile} (масштаб {scale:g})...", file=sys.stderr)
+    GENERATORS[profile](random.Random(f"{profile}:{seed}"), root, scale)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    return root
+
+
+def peak_rss_mb(who):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux сообщает в КБ, macOS - в байтах
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def run_case(args):
+    # Один замер в текущем процессе
+    from search_engine import SearchEngine
+
+    engine = SearchEngine(
+        args.corpus,
+        args.ext,
+        args.keywords,
+        args.max_size,
+        True,
+        args.match,
+        workers=args.workers,
+        pool_type=args.pool,
+        use_index=args.index,
+        text_cache_mb=args.text_cache,
+        keep_results=False
+    )
+    first_hit = []
+    start = time.perf_counter()
+    engine.on_match = lambda match: first_hit or first_hit.append(time.perf_counter() - start)
+    engine.run()
+    elapsed = time.perf_counter() - start
+
+    try:
+        import resource
+        children = resource.RUSAGE_CHILDREN
+        own = resource.RUSAGE_SELF
+    except ImportError:
+        children = own = None
+    megabytes = engine.processed_bytes / (1024 * 1024)
+    result = {
+        "files": engine.processed_files,
+        "bytes": engine.processed_bytes,
+        "matches": engine.matches_found,
+        "seconds": round(elapsed, 4),
+        "files_per_sec": round(engine.processed_files / elapsed, 1) if elapsed else None,
+        "mb_per_sec": round(megabytes / elapsed, 2) if elapsed else None,
+        "first_hit_sec": round(first_hit[0], 4) if first_hit else None,
+        "peak_rss_mb": peak_rss_mb(own) if own is not None else None,
+        "children_peak_rss_mb": peak_rss_mb(children) if children is not None else None,
+        "stages": engine.timings.snapshot(),
+    }
+    sys.stdout.write(json.dumps(result) + "\n")
+    return 0
+
+
+def measure(corpus, profile, case, args):
+    keywords, match_type = CASES[case]
+    command = [
+        sys.executable, os.path.abspath(__file__), "case",
+        "--corpus", corpus,
+        "--ext", PROFILES[profile],
+        "--keywords", keywords,
+        "--match", match_type,
+        "--pool", args.pool,
+        "--max-size", str(args.max_size),
+        "--text-cache", str(args.text_cache),
+    ]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if args.index:
+        command.append("--index")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_suite(args):
+    base = args.corpus_dir or data_dir("benchmark")
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for profile in args.profile:
+            corpus = ensure_corpus(base, profile, args.scale, args.seed)
+            for case in args.case:
+                # Прогревочный замер (файлы попадают в кэш ОС) не записывается
+                if args.warmup:
+                    measure(corpus, profile, case, args)
+                for repeat in range(args.repeat):
+                    result = measure(corpus, profile, case, args)
+                    record = {
+                        "label": args.label,
+                        "profile": profile,
+                        "case": case,
+                        "repeat": repeat,
+                        "scale": args.scale,
+                        "seed": args.seed,
+                        "pool": args.pool,
+                        "workers": args.workers or os.cpu_count(),
+                        "index": args.index,
+                        "python": platform.python_version(),
+                        "platform": sys.platform,
+                    }
+                    record.update(result)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    print(f"{profile}/{case}: {result['seconds']:.3f} сек, "
+                          f"{result['files_per_sec']} файл/сек, {result['mb_per_sec']} МБ/сек",
+                          file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def load_results(path):
+    # (профиль, вариант) -> список замеров
+    grouped = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                grouped.setdefault((record["profile"], record["case"]), []).append(record)
+    return grouped
+
+
+def median(records, key):
+    values = [r[key] for r in records if r.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+def compare(args):
+    before = load_results(args.before)
+    after = load_results(args.after)
+    print(f"{'набор/вариант':<20} {'сек (было → стало)':>26} {'изменение':>10} {'найдено':>10}")
+    for key in sorted(before.keys() & after.keys()):
+        old = median(before[key], "seconds")
+        new = median(after[key], "seconds")
+        change = f"{(new / old - 1) * 100:+.1f}%" if old else "-"
+        matches = "=" if median(before[key], "matches") == median(after[key], "matches") else "РАЗНИЦА"
+        print(f"{'/'.join(key):<20} {old:>12.3f} → {new:<11.3f} {change:>10} {matches:>10}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Замер производительности поиска Xillen File Finder")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="выполнить замеры")
+    run.add_argument("-p", "--profile", nargs="+", choices=list(PROFILES), default=list(PROFILES),
+                     help="наборы файлов (по умолчанию - все)")
+    run.add_argument("-c", "--case", nargs="+", choices=list(CASES), default=list(CASES),
+                     help="варианты запроса (по умолчанию - все)")
+    run.add_argument("--scale", type=float, default=1.0,
+                     help="множитель размера наборов (по умолчанию: %(default)s)")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("-r", "--repeat", type=int, default=3,
+                     help="число замеров каждого варианта (по умолчанию: %(default)s)")
+    run.add_argument("--no-warmup", dest="warmup", action="store_false",
+                     help="не делать прогревочный замер (холодный кэш ОС)")
+    run.add_argument("--corpus-dir", help="папка для наборов файлов")
+    run.add_argument("-o", "--output", help="файл результатов JSON Lines (по умолчанию - stdout)")
+    run.add_argument("--label", default="", help="метка версии в результатах")
+
+    case = commands.add_parser("case")
+    case.add_argument("--corpus", required=True)
+    case.add_argument("--ext", required=True)
+    case.add_argument("--keywords", required=True)
+    case.add_argument("--match", choices=["any", "all"], default="any")
+
+    for command in (run, case):
+        command.add_argument("-j", "--workers", type=int, default=None)
+        command.add_argument("--pool", choices=["thread", "process"], default="thread")
+        command.add_argument("--index", action="store_true")
+        command.add_argument("--text-cache", type=int, default=0, metavar="MB")
+        command.add_argument("-s", "--max-size", type=int, default=1024, metavar="MB")
+
+    diff = commands.add_parser("compare", help="сравнить два файла результатов")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "case":
+        return run_case(args)
+    if args.command == "compare":
+        return compare(args)
+    return run_suite(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import codecs
+
+# Поиск в нескольких кодировках без декодирования файлов: ключевые слова один
+# раз кодируются в каждую кодировку, и байты файла сравниваются с ними
+# напрямую. Регистр приводится прямо в байтах таблицей bytes.translate.
+# Где таблица не даёт точного результата, файл декодируется как обычно
+
+# Сколько байт начала файла смотреть при определении кодировки
+SNIFF_SIZE = 4096
+
+# Перевод ASCII в нижний регистр - то же, что bytes.lower()
+ASCII_FOLD = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", b"abcdefghijklmnopqrstuvwxyz")
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+def normalize_encodings(text):
+    # Кодировки через запятую -> канонические имена. UTF-16 без указания
+    # порядка байт проверяется в обоих вариантах. Только UTF-8 - то же, что
+    # пустой список: файлы декодируются, как без выбора кодировок
+    encodings = []
+    for name in text.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            name = codecs.lookup(name).name
+        except LookupError:
+            raise ValueError(f"Неизвестная кодировка: {name}")
+        if name == "utf-16":
+            encodings += ["utf-16-le", "utf-16-be"]
+        else:
+            encodings.append(name)
+    encodings = list(dict.fromkeys(encodings))
+    return [] if encodings == ["utf-8"] else encodings
+
+
+def is_wide(encoding):
+    return encoding.startswith("utf-16")
+
+
+def detect_encodings(head, encodings):
+    # Кодировки, в которых стоит проверять файл, по его началу: метка BOM,
+    # затем нулевые байты через один (UTF-16), затем проверка на UTF-8.
+    # Пустой список - файл бинарный
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return [name] if name == "utf-8" or name in encodings else []
+
+    if b'\x00' in head:
+        sample = head[:SNIFF_SIZE]
+        # В UTF-16 у латиницы и цифр нулевой старший байт
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        half = len(sample) // 2 or 1
+        if odd_zeros > half // 4 and even_zeros < half // 16 and "utf-16-le" in encodings:
+            return ["utf-16-le"]
+        if even_zeros > half // 4 and odd_zeros < half // 16 and "utf-16-be" in encodings:
+            return ["utf-16-be"]
+        return []
+
+    narrow = [name for name in encodings if not is_wide(name)]
+    if head.isascii():
+        # Только ASCII в начале - дальше может быть любая однобайтовая кодировка
+        return narrow
+    try:
+        # Незаконченный символ на границе образца допустим
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return [name for name in narrow if name != "utf-8"] or narrow
+    return ["utf-8"] if "utf-8" in narrow else narrow
+
+
+def fold_table(encoding, keywords):
+    # Таблица перевода байтов в нижний регистр для bytes.translate или None -
+    # если по байтам регистр точно не привести. Для однобайтовых кодировок
+    # строится по самой кодировке. В UTF-8 байты ASCII не встречаются внутри
+    # других символов, но буквы вне ASCII по байтам не привести - таблица
+    # годится, только если все слова из ASCII. В UTF-16 и многобайтовых
+    # кодировках (Shift_JIS и т.п.) байт буквы может оказаться частью другого
+    # символа - там таблицы нет
+    if encoding == "utf-8":
+        return ASCII_FOLD if all(keyword.isascii() for keyword in keywords) else None
+    if is_wide(encoding):
+        return None
+    table = bytearray(range(256))
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for byte in range(256):
+        try:
+            char = decoder.decode(bytes([byte]), final=False)
+        except UnicodeDecodeError:
+            decoder.reset()
+            continue
+        if not char:
+            # Байт начинает многобайтовый символ
+            return None
+        try:
+            folded = char.lower().encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        if len(folded) == 1:
+            table[byte] = folded[0]
+    return bytes(table)
+
+
+class ByteMatcher:
+    # Поиск ключевых слов в байтах файла. Для каждой кодировки слова кодируются
+    # один раз; для файла выбирается набор кодировок по его началу. Кодировки
+    # без таблицы регистра (decoded) проверяются декодированием текста
+
+    def __init__(self, keywords, match_type, encodings):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.match_type = match_type
+        self.encodings = encodings
+        self.full_mask = (1 << len(self.keywords)) - 1
+        # Кодировка -> таблица регистра
+        self.tables = {}
+        self.decoded = set()
+        for encoding in encodings:
+            table = fold_table(encoding, self.keywords)
+            if table is None:
+                self.decoded.add(encoding)
+            else:
+                self.tables[encoding] = table
+        # Кодировка -> [(бит слова, байты в нижнем регистре), ...]
+        self.needles = {}
+        for encoding, table in self.tables.items():
+            needles = []
+            for i, keyword in enumerate(self.keywords):
+                try:
+                    needles.append((1 << i, keyword.encode(encoding).translate(table)))
+                except UnicodeEncodeError:
+                    # Слова нет в этой кодировке - в ней оно не встретится
+                    continue
+            self.needles[encoding] = needles
+        # Набор кодировок файла -> (группы (таблица, образцы), перекрытие фрагментов)
+        self.plans = {}
+
+    def plan(self, encodings):
+        # Кодировки с одинаковой таблицей проверяются по одной копии фрагмента
+        key = tuple(encodings)
+        plan = self.plans.get(key)
+        if plan is None:
+            groups = {}
+            for name in encodings:
+                if name in self.tables:
+                    groups.setdefault(self.tables[name], []).extend(self.needles[name])
+            groups = [(table, list(dict.fromkeys(needles))) for table, needles in groups.items() if needles]
+            overlap = max((len(needle) for _, needles in groups for _, needle in needles), default=1) - 1
+            plan = self.plans[key] = (groups, overlap)
+        return plan
+
+    def is_decided(self, found):
+        if self.match_type == "any":
+            return found != 0
+        return found == self.full_mask
+
+    def is_match(self, found):
+        if not self.keywords:
+            return True
+        return self.is_decided(found)
+
+    def feed(self, data, plan, found=0, state=b''):
+        # Возвращает (маска найденных слов, хвост фрагмента). Слово на границе
+        # фрагментов ищется в стыке хвоста и начала нового фрагмента, без
+        # склейки фрагментов целиком
+        groups, overlap = plan
+        tail = data[-overlap:] if overlap else b''
+        for table, needles in groups:
+            window = data.translate(table)
+            boundary = (state + data[:overlap]).translate(table) if state else None
+            for bit, needle in needles:
+                if found & bit:
+                    continue
+                if needle in window or (boundary is not None and needle in boundary):
+                    found |= bit
+                    if self.is_decided(found):
+                        return found, tail
+        return found, tail
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import shutil
+
+from storage import data_dir, query_key
+
+# Как часто сохранять состояние поиска, сек
+CHECKPOINT_INTERVAL = 30
+
+# Журналы незавершённых поисков: сколько хранить и как долго, сек.
+# Лишние и устаревшие удаляются при открытии нового журнала
+MAX_JOURNALS = 16
+MAX_JOURNAL_AGE = 30 * 24 * 3600
+
+STATE_FILE = "state.json"
+MATCHES_FILE = "matches.jsonl"
+
+
+class SearchJournal:
+    # Журнал одного поиска для продолжения после остановки или сбоя.
+    # matches.jsonl - найденные файлы, дописываются по одному; state.json -
+    # очередь необойдённых папок, начатые, но не проверенные файлы, счётчики
+    # и длина matches.jsonl на момент сохранения. При продолжении всё, что
+    # дописано после последнего сохранения, отбрасывается: эти файлы числятся
+    # непроверенными и будут проверены снова
+
+    def __init__(self, params):
+        # Поиск определяется своими параметрами: продолжить можно только такой же
+        self.params = params
+        self.path = os.path.join(data_dir("checkpoints"), query_key(params))
+        self.matches_file = None
+
+    def load(self):
+        # Сохранённое состояние или None
+        try:
+            with open(os.path.join(self.path, STATE_FILE), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get("params") == self.params else None
+
+    def load_matches(self, offset):
+        # Найденные до сохранения файлы; лишние строки после offset удаляются.
+        # Вызывается до open, чтобы дописывание шло с новой длины файла
+        matches_path = os.path.join(self.path, MATCHES_FILE)
+        matches = []
+        if not os.path.exists(matches_path):
+            return matches
+        with open(matches_path, 'r+b') as f:
+            f.truncate(offset)
+            for line in f:
+                matches.append(json.loads(line))
+        return matches
+
+    def open(self, resume):
+        self.evict()
+        os.makedirs(self.path, exist_ok=True)
+        # Текущий журнал - самый свежий
+        os.utime(self.path)
+        mode = 'ab' if resume else 'wb'
+        self.matches_file = open(os.path.join(self.path, MATCHES_FILE), mode)
+
+    def evict(self):
+        journals_dir = os.path.dirname(self.path)
+        journals = []
+        for name in os.listdir(journals_dir):
+            path = os.path.join(journals_dir, name)
+            if path == self.path:
+                continue
+            try:
+                journals.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+        journals.sort(reverse=True)
+        oldest = time.time() - MAX_JOURNAL_AGE
+        # Вместе с текущим - не больше MAX_JOURNALS
+        for i, (mtime, path) in enumerate(journals):
+            if i >= MAX_JOURNALS - 1 or mtime < oldest:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def add_match(self, match):
+        self.matches_file.write(json.dumps(match, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def save(self, state):
+        # Сначала на диск попадают найденные файлы, затем состояние, которое
+        # на них ссылается. Состояние заменяется атомарно
+        self.matches_file.flush()
+        os.fsync(self.matches_file.fileno())
+        # Длина по самому файлу: позиция дескриптора в режиме дописывания
+        # может отставать от неё
+        offset = os.fstat(self.matches_file.fileno()).st_size
+        state = dict(state, params=self.params, matches_offset=offset)
+        state_path = os.path.join(self.path, STATE_FILE)
+        temp_path = state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, state_path)
+
+    def close(self):
+        if self.matches_file is not None:
+            self.matches_file.close()
+            self.matches_file = None
+
+    def remove(self):
+        # Поиск завершён - продолжать нечего
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
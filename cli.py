@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import argparse
+
+from search_engine import SearchEngine, format_size
+from snippets import SnippetFinder
+from disk_io import IO_ORDERS
+from result_export import EXPORT_FORMATS
+
+# Консольная версия поиска: не загружает PyQt6 и не требует дисплея, поэтому
+# подходит для cron и серверов. Найденные файлы выводятся в формате JSON Lines
+# сразу по мере нахождения
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Xillen File Finder - поиск файлов по содержимому (консольная версия)"
+    )
+    parser.add_argument("path", help="папка поиска")
+    parser.add_argument("-e", "--ext", default=".txt, .pdf, .docx, .xlsx, .pptx",
+                        help="расширения файлов через запятую (по умолчанию: %(default)s)")
+    parser.add_argument("-x", "--exclude", default="",
+                        help="исключить папки и файлы: шаблоны в стиле .gitignore через запятую")
+    parser.add_argument("-i", "--include", default="",
+                        help="проверять только файлы, подходящие к шаблонам через запятую")
+    parser.add_argument("--gitignore", action="store_true",
+                        help="учитывать правила .gitignore в папках поиска")
+    parser.add_argument("-n", "--name", default="", metavar="PATTERN",
+                        help="искать по имени файла: подстрока или шаблон (*, ?, [...]); с '/' - по пути. "
+                             "Без -k содержимое не читается, с --index - по индексу путей")
+    parser.add_argument("-k", "--keywords", default="",
+                        help="ключевые слова через запятую")
+    parser.add_argument("-m", "--match", choices=["any", "all"], default="any",
+                        help="any - любое из слов (OR), all - все слова (AND)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("-w", "--word", dest="pattern_mode", action="store_const", const="word", default="text",
+                      help="искать только целые слова")
+    mode.add_argument("-E", "--regex", dest="pattern_mode", action="store_const", const="regex",
+                      help="ключевые слова - регулярные выражения (синтаксис Python, без учёта регистра)")
+    parser.add_argument("--encodings", default="", metavar="LIST",
+                        help="кодировки текстовых файлов через запятую, например utf-8,cp1251,koi8-r,utf-16 "
+                             "(по умолчанию - только UTF-8)")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="искать одинаковые файлы вместо поиска по содержимому (поле group - номер группы)")
+    parser.add_argument("--top", type=int, default=0, metavar="K",
+                        help="вывести K лучших по релевантности (BM25) после завершения поиска")
+    parser.add_argument("-s", "--max-size", type=int, default=50, metavar="MB",
+                        help="максимальный размер файла в МБ (по умолчанию: %(default)s)")
+    binary = parser.add_mutually_exclusive_group()
+    binary.add_argument("--skip-binary", dest="skip_binary", action="store_true", default=True,
+                        help="пропускать бинарные файлы (по умолчанию)")
+    binary.add_argument("--no-skip-binary", dest="skip_binary", action="store_false",
+                        help="проверять и бинарные файлы")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="число обработчиков (по умолчанию - число ядер)")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread",
+                        help="потоки (диск) или процессы (CPU)")
+    parser.add_argument("--io-order", choices=IO_ORDERS, default="walk",
+                        help="порядок чтения файлов: walk - порядок обхода, inode - по номеру inode, "
+                             "extent - по размещению на диске (FIEMAP); для HDD и RAID")
+    parser.add_argument("--fadvise", action="store_true",
+                        help="освобождать прочитанные файлы из кэша ОС, чтобы не вытеснять данные других программ")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="сохранять состояние поиска, чтобы продолжить его после остановки или сбоя")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванный поиск с теми же параметрами (найденные ранее файлы выводятся снова)")
+    parser.add_argument("--cache", action="store_true",
+                        help="кэшировать результаты запроса: при повторе проверяются только изменённые папки и файлы")
+    parser.add_argument("--index", action="store_true",
+                        help="использовать индекс для повторных поисков (с -n - индекс путей)")
+    parser.add_argument("--text-cache", type=int, default=0, metavar="MB",
+                        help="кэш текста документов в МБ (0 - отключён)")
+    parser.add_argument("-o", "--export", metavar="FILE", default="",
+                        help="писать найденные файлы в FILE во время поиска вместо вывода в stdout "
+                             "(формат по расширению: .csv, .jsonl, .bin)")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS, default="",
+                        help="формат файла --export, если он не следует из расширения")
+    parser.add_argument("--snippets", action="store_true",
+                        help="добавить к найденным файлам фрагменты совпадений с номерами строк")
+    parser.add_argument("--stats", action="store_true",
+                        help="вывести в stderr время по этапам поиска")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="записать отчёт cProfile в файл (обработка в одном потоке)")
+    return parser
+
+
+def write_match(match, snippet_finder=None):
+    record = {
+        "path": match["file_path"],
+        "filename": match["filename"],
+        "size": match["size_bytes"],
+        "mtime": match["mtime"]
+    }
+    if "score" in match:
+        record["score"] = match["score"]
+    if "group" in match:
+        record["group"] = match["group"]
+    if snippet_finder is not None:
+        try:
+            record["snippets"] = [
+                {"line": number, "text": text} for number, text in snippet_finder.find(match["file_path"])
+            ]
+        except OSError:
+            record["snippets"] = []
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.path):
+        print("Указанный путь не существует", file=sys.stderr)
+        return 2
+
+    try:
+        engine = SearchEngine(
+            args.path,
+            args.ext,
+            args.keywords,
+            args.max_size,
+            args.skip_binary,
+            args.match,
+            workers=args.workers,
+            pool_type=args.pool,
+            use_index=args.index,
+            text_cache_mb=args.text_cache,
+            keep_results=False,
+            profile_path=args.profile,
+            pattern_mode=args.pattern_mode,
+            exclude=args.exclude,
+            include=args.include,
+            use_gitignore=args.gitignore,
+            top_k=args.top,
+            encodings=args.encodings,
+            duplicates=args.duplicates,
+            name_pattern=args.name,
+            io_order=args.io_order,
+            cache_hints=args.fadvise,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            query_cache=args.cache,
+            export_path=args.export,
+            export_format=args.export_format
+        )
+    except ValueError as e:
+        # Ошибка в регулярном выражении, неизвестная кодировка или формат выгрузки
+        print(str(e), file=sys.stderr)
+        return 2
+    if args.export:
+        # Найденные файлы пишет выгрузка
+        engine.on_match = None
+    elif args.snippets and engine.keywords and not args.duplicates:
+        # Фрагменты ищутся только в найденных файлах, уже после проверки
+        snippet_finder = SnippetFinder(engine.keywords, engine.pattern_mode, engine.encodings)
+        engine.on_match = lambda match: write_match(match, snippet_finder)
+    else:
+        engine.on_match = write_match
+
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        engine.stop()
+        return 130
+    except BrokenPipeError:
+        # Получатель вывода закрыл канал (например, `| head`)
+        engine.stop()
+        sys.stdout = open(os.devnull, 'w')
+        return 0
+    except Exception as e:
+        print(f"Ошибка поиска: {str(e)}", file=sys.stderr)
+        return 2
+
+    if args.stats:
+        print(f"Этапы: {engine.timings.summary()}", file=sys.stderr)
+        if args.duplicates:
+            print(f"Групп дубликатов: {engine.duplicate_groups}, прочитано {format_size(engine.processed_bytes)}",
+                  file=sys.stderr)
+    if engine.processed_files == 0 and engine.name_pattern is None:
+        print("Файлы с указанными расширениями не найдены", file=sys.stderr)
+    # Как у grep: 0 - найдено, 1 - ничего не найдено
+    return 0 if engine.matches_found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
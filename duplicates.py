@@ -0,0 +1,57 @@
+import hashlib
+
+from scanner import read_chunks
+from stage_timings import StageTimings, clock
+
+# Сколько байт начала и конца файла хэшировать на втором этапе
+EDGE_SIZE = 64 * 1024
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+
+def edge_digest(file_path, st, timings=None):
+    # Хэш первого и последнего блока. Файлы не больше двух блоков
+    # хэшируются целиком - для них это уже окончательный ответ.
+    # Возвращает (хэш, прочитано байт)
+    if timings is None:
+        timings = StageTimings()
+    digest = new_hash()
+    with open(file_path, 'rb') as f:
+        start = clock()
+        data = f.read(EDGE_SIZE)
+        if st.st_size > EDGE_SIZE:
+            f.seek(max(st.st_size - EDGE_SIZE, EDGE_SIZE))
+            data += f.read(EDGE_SIZE)
+        now = clock()
+        timings.add("read", now - start)
+        digest.update(data)
+        timings.add("hash", clock() - now)
+    return digest.hexdigest(), len(data)
+
+
+def full_digest(file_path, st, timings=None):
+    if timings is None:
+        timings = StageTimings()
+    digest = new_hash()
+    size = 0
+    with open(file_path, 'rb') as f:
+        start = clock()
+        for chunk in read_chunks(f):
+            size += len(chunk)
+            now = clock()
+            timings.add("read", now - start)
+            digest.update(chunk)
+            start = clock()
+            timings.add("hash", start - now)
+    return digest.hexdigest(), size
+
+
+def edges_cover_file(size):
+    return size <= 2 * EDGE_SIZE
+
+
+def split_groups(groups):
+    # Группы, в которых больше одного файла
+    return [files for files in groups.values() if len(files) > 1]
@@ -0,0 +1,80 @@
+import os
+import re
+import codecs
+import zipfile
+from html import unescape
+
+from pdf_text import extract_pdf
+
+# Размер порции при распаковке частей архива
+READ_SIZE = 64 * 1024
+
+# Части документов Office Open XML, в которых хранится текст
+OOXML_PARTS = {
+    '.docx': re.compile(r'word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$'),
+    '.xlsx': re.compile(r'xl/(sharedStrings|worksheets/sheet\d+)\.xml$'),
+    '.pptx': re.compile(r'ppt/(slides/slide\d+|notesSlides/notesSlide\d+)\.xml$'),
+}
+
+# Теги, на месте которых в тексте должен быть разделитель (абзацы, ячейки, переносы)
+SEPARATOR_TAGS = {'p', 'br', 'cr', 'tab', 'tc', 'tr', 'si', 'c', 'row'}
+TAG_RE = re.compile(r'<(/?)([^\s/>]*)[^>]*>')
+
+
+def tag_separator(match):
+    name = match.group(2).rpartition(':')[2]
+    return ' ' if name in SEPARATOR_TAGS else ''
+
+
+class XmlTextStream:
+    # Потоковое извлечение текста из XML без построения дерева: теги убираются,
+    # сущности раскрываются. Незаконченный тег или сущность в конце порции
+    # откладываются до следующей порции
+
+    def __init__(self):
+        self.pending = ''
+
+    def feed(self, data):
+        data = self.pending + data
+        self.pending = ''
+        cut = data.rfind('<')
+        if cut != -1 and data.find('>', cut) == -1:
+            self.pending = data[cut:]
+            data = data[:cut]
+        amp = data.rfind('&')
+        if amp != -1 and data.find(';', amp) == -1 and len(data) - amp < 12:
+            self.pending = data[amp:] + self.pending
+            data = data[:amp]
+        return unescape(TAG_RE.sub(tag_separator, data))
+
+
+def extract_ooxml(f, parts):
+    # Текст документа DOCX/XLSX/PPTX: распаковываются только нужные XML-части
+    with zipfile.ZipFile(f) as archive:
+        for name in archive.namelist():
+            if not parts.match(name):
+                continue
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            stream = XmlTextStream()
+            with archive.open(name) as part:
+                while True:
+                    data = part.read(READ_SIZE)
+                    if not data:
+                        break
+                    text = stream.feed(decoder.decode(data))
+                    if text:
+                        yield text
+            # Разделитель между частями документа
+            yield ' '
+
+
+def get_extractor(file_path):
+    # Функция извлечения текста для формата файла (DOCX, XLSX, PPTX, PDF)
+    # или None, если файл читается как обычный текст
+    ext = os.path.splitext(file_path)[1].lower()
+    parts = OOXML_PARTS.get(ext)
+    if parts is not None:
+        return lambda f: extract_ooxml(f, parts)
+    if ext == '.pdf':
+        return extract_pdf
+    return None
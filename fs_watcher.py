@@ -0,0 +1,356 @@
+import os
+import sys
+import stat
+import time
+import queue
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+from scanner import FileScanner
+from path_index import PathIndex
+from search_index import SearchIndex
+
+# Флаги inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Период обхода для резервного режима без inotify, сек
+POLL_INTERVAL = 30
+
+
+def is_hidden(root, path):
+    # Скрытые файлы и папки (относительно папки поиска) не отслеживаются
+    rel = os.path.relpath(path, root)
+    return any(part.startswith('.') for part in rel.split(os.sep) if part not in ('', os.curdir))
+
+
+class InotifyBackend:
+    # Отслеживание изменений через inotify (Linux), вызовы libc через ctypes
+
+    def __init__(self, root, on_change, on_overflow):
+        self.root = root
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.watches = {}
+        self.is_running = True
+        # Установлено, когда все папки поставлены на наблюдение
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="inotify-watcher", daemon=True)
+
+    def start(self):
+        # Папки ставятся на наблюдение в потоке: на больших деревьях это долго
+        self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+        self.thread.join()
+        os.close(self.fd)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # ENOSPC - исчерпан лимит max_user_watches: события могут теряться
+            self.on_overflow()
+            return
+        self.watches[wd] = path
+
+    def add_tree(self, path):
+        stack = [path]
+        while stack and self.is_running:
+            current = stack.pop()
+            self.add_watch(current)
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def forget_tree(self, path):
+        prefix = path + os.sep
+        for wd, watched in list(self.watches.items()):
+            if watched == path or watched.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+
+    def run(self):
+        self.add_tree(self.root)
+        self.ready.set()
+        while self.is_running:
+            ready, _, _ = select.select([self.fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self.handle_events(data)
+
+    def handle_events(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self.on_overflow()
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            base = self.watches.get(wd)
+            if base is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Папка удалена или перенесена - её новое место придёт событием MOVED_TO
+                self.forget_tree(base)
+                continue
+            if not name or name.startswith(b'.'):
+                continue
+
+            path = os.path.join(base, os.fsdecode(name))
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(path)
+            self.on_change(path)
+
+
+class PollingBackend:
+    # Резервный режим: периодический обход со сравнением размеров и дат изменения.
+    # Индекс отстаёт от диска не более чем на POLL_INTERVAL секунд
+
+    def __init__(self, root, on_change, on_overflow, interval=POLL_INTERVAL):
+        self.root = root
+        self.on_change = on_change
+        self.interval = interval
+        self.snapshot = {}
+        self.stop_event = threading.Event()
+        # Установлено, когда снят первый снимок папки
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="polling-watcher", daemon=True)
+
+    def start(self):
+        # Первый снимок снимается в потоке: на больших деревьях это долго
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def take_snapshot(self):
+        snapshot = {}
+        stack = [self.root]
+        while stack and not self.stop_event.is_set():
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                st = entry.stat()
+                                snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snapshot
+
+    def run(self):
+        self.snapshot = self.take_snapshot()
+        self.ready.set()
+        while not self.stop_event.wait(self.interval):
+            snapshot = self.take_snapshot()
+            for path, meta in snapshot.items():
+                if self.snapshot.get(path) != meta:
+                    self.on_change(path)
+            for path in self.snapshot.keys() - snapshot.keys():
+                self.on_change(path)
+            self.snapshot = snapshot
+
+
+class IndexWatcher:
+    # Следит за папкой поиска и в фоне обновляет индекс изменённых файлов.
+    # Пока наблюдение не прерывалось, поиск по индексу не требует обхода папки
+
+    def __init__(self, root, skip_binary=True):
+        self.root = os.path.abspath(root)
+        self.scanner = FileScanner([], "any", skip_binary)
+        self.queue = queue.Queue()
+        self.queued = set()
+        self.lock = threading.Lock()
+        # Расширение -> максимальный размер файлов, которые должны быть в индексе
+        self.coverage = {}
+        self.synced = False
+        self.reliable = True
+        # Наблюдение за всей папкой уже шло, когда начался обход поиска
+        self.watched_before_sync = False
+        # Когда замечено, что наблюдение установлено, и когда последний раз
+        # терялись события - по ним проверяется индекс путей
+        self.ready_at = None
+        self.lost_at = 0
+        self.updater = threading.Thread(target=self.run_updater, name="index-updater", daemon=True)
+        if sys.platform.startswith("linux"):
+            try:
+                self.backend = InotifyBackend(self.root, self.on_change, self.on_overflow)
+            except (OSError, AttributeError):
+                self.backend = PollingBackend(self.root, self.on_change, self.on_overflow)
+        else:
+            self.backend = PollingBackend(self.root, self.on_change, self.on_overflow)
+
+    def start(self):
+        self.backend.start()
+        self.updater.start()
+
+    def stop(self):
+        self.backend.stop()
+        self.queue.put(None)
+        self.updater.join()
+
+    def on_change(self, path):
+        with self.lock:
+            if path in self.queued:
+                return
+            self.queued.add(path)
+        self.queue.put(path)
+
+    def on_overflow(self):
+        # Часть событий потеряна - до следующего полного обхода индексу не доверяем
+        self.reliable = False
+        self.lost_at = time.time()
+
+    def begin_sync(self, extensions, max_size_bytes):
+        # Вызывается перед полным обходом: изменения во время обхода уже попадут в индекс.
+        # Если наблюдение ещё устанавливается, изменения в уже пройденных
+        # обходом папках могут потеряться - такой обход индекс не подтверждает
+        self.coverage = {ext: max_size_bytes for ext in extensions}
+        self.synced = False
+        self.reliable = True
+        self.watched_before_sync = self.backend.ready.is_set()
+
+    def end_sync(self):
+        self.synced = self.watched_before_sync
+
+    def covers(self, extensions, max_size_bytes):
+        return self.synced and self.reliable and all(
+            self.coverage.get(ext, -1) >= max_size_bytes for ext in extensions
+        )
+
+    def tracks_paths_since(self, built_at):
+        # Индекс путей, построенный после установки наблюдения и без потерь
+        # событий с тех пор, наблюдатель поддерживает в актуальном состоянии
+        if self.ready_at is None:
+            if not self.backend.ready.is_set():
+                return False
+            self.ready_at = time.time()
+        return built_at is not None and built_at >= max(self.ready_at, self.lost_at)
+
+    def flush(self, is_running=lambda: True, timeout=0.2):
+        # Дожидаемся обработки всех накопленных изменений, каждые timeout секунд
+        # проверяя, не остановлен ли поиск. False - ожидание прервано
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if not is_running():
+                    return False
+                self.queue.all_tasks_done.wait(timeout)
+        return True
+
+    def run_updater(self):
+        index = SearchIndex(self.root)
+        path_index = PathIndex(self.root)
+        try:
+            while True:
+                path = self.queue.get()
+                if path is None:
+                    self.queue.task_done()
+                    return
+                with self.lock:
+                    self.queued.discard(path)
+                try:
+                    self.update_paths(path_index, path)
+                except Exception:
+                    # Изменение не попало в индекс путей - он будет перестроен
+                    self.lost_at = time.time()
+                try:
+                    self.reindex(index, path)
+                except Exception:
+                    pass
+                if self.queue.empty():
+                    index.conn.commit()
+                    path_index.conn.commit()
+                self.queue.task_done()
+        finally:
+            index.close()
+            path_index.close()
+
+    def update_paths(self, path_index, path):
+        # Индекс путей хранит все файлы папки, без фильтров по расширению и размеру
+        if is_hidden(self.root, path):
+            return
+        rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            path_index.remove_tree(rel_path)
+            return
+        if stat.S_ISREG(st.st_mode):
+            path_index.add(rel_path, st)
+
+    def reindex(self, index, path):
+        if is_hidden(self.root, path):
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # Удалён файл или папка целиком
+            index.remove(path)
+            index.remove_tree(path)
+            return
+
+        if os.path.isdir(path):
+            # Новая или перенесённая папка: индексируем её содержимое
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for file in files:
+                    if not file.startswith('.'):
+                        self.on_change(os.path.join(root, file))
+            return
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in self.coverage or st.st_size > self.coverage[ext]:
+            index.remove(path)
+            return
+        if index.is_fresh(index.lookup(path), st):
+            return
+        _, binary, exact, terms = self.scanner.index(path, st)
+        index.update(path, st, binary, exact, terms)
@@ -1,17 +1,27 @@
 import os
 import sys
-import mmap
 import time
 import csv
-from datetime import datetime
+import threading
+from array import array
+from collections import OrderedDict
 from PyQt6.QtGui import QAction, QColor, QPalette, QBrush, QIcon, QPixmap, QPainter, QFont, QPolygonF, QPen
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QLineEdit,
-    QPushButton, QTableWidget, QTableWidgetItem, QAbstractItemView, QGroupBox,
+    QPushButton, QTableView, QAbstractItemView, QGroupBox,
     QFileDialog, QMessageBox, QProgressBar, QHeaderView, QDialog, QTextBrowser,
-    QComboBox, QCheckBox, QFrame, QSizePolicy, QStyleFactory
+    QComboBox, QCheckBox, QSpinBox, QFrame, QSizePolicy, QStyleFactory, QScrollArea
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QPointF, QSize, QDir
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QPointF, QSize, QDir, QAbstractTableModel, QModelIndex
+
+from search_engine import SearchEngine, format_size, format_modified
+from fs_watcher import IndexWatcher
+from matcher import PATTERN_MODES, create_matcher, split_keywords
+from storage import data_dir
+from byte_search import normalize_encodings
+from disk_io import IO_ORDERS, HAS_FADVISE
+from result_export import export_format_for
+from snippets import SnippetFinder, format_snippets
 
 # ====================== НАСТРОЙКИ ТЕМ ======================
 DARK_THEME = {
@@ -39,188 +49,60 @@ DARK_THEME = {
 CURRENT_THEME = DARK_THEME
 
 class FileSearchWorker(QThread):
-    update_progress = pyqtSignal(int, int, str)
-    finished = pyqtSignal(list)
+    update_progress = pyqtSignal(dict)  # сводка SearchEngine.report_progress
+    finished = pyqtSignal(int)  # число найденных файлов
     error = pyqtSignal(str)
-    found_match = pyqtSignal(str, str, str, str)  # file_path, filename, size, modified
+    found_matches = pyqtSignal(list)  # [(file_path, size_bytes, mtime, score, group), ...]
+
+    # Найденные файлы передаются в окно пачками вместе со сводкой о ходе поиска
+    BATCH_MAX = 5000
 
-    def __init__(self, search_path, extensions, keywords, max_size_mb, skip_binary, match_type):
+    def __init__(self, *args, **kwargs):
+        # Параметры поиска - как у SearchEngine
         super().__init__()
-        self.search_path = search_path
-        self.extensions = self.normalize_extensions(extensions)
-        self.keywords = [kw.strip().lower() for kw in keywords.split(',') if kw.strip()]
-        self.results = []
-        self.is_running = True
-        self.file_count = 0
-        self.processed_files = 0
-        self.max_size_bytes = max_size_mb * 1024 * 1024
-        self.skip_binary = skip_binary
-        self.match_type = match_type
+        # Результаты хранит модель таблицы, копия в движке не нужна
+        kwargs.setdefault("keep_results", False)
+        self.engine = SearchEngine(*args, **kwargs)
+        self.engine.on_progress = self.emit_progress
+        self.engine.on_match = self.queue_match
+        self.batch = []
+
+    @property
+    def processed_files(self):
+        return self.engine.processed_files
+
+    def queue_match(self, match):
+        self.batch.append((
+            match["file_path"], match["size_bytes"], match["mtime"], match.get("score", 0.0), match.get("group", 0)
+        ))
+        if len(self.batch) >= self.BATCH_MAX:
+            self.flush_matches()
+
+    def flush_matches(self):
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.found_matches.emit(batch)
 
-    def normalize_extensions(self, extensions):
-        normalized = []
-        for ext in extensions.split(','):
-            ext = ext.strip().lower()
-            if not ext:
-                continue
-            if not ext.startswith('.'):
-                ext = '.' + ext
-            normalized.append(ext)
-        return normalized
+    def emit_progress(self, snapshot):
+        # Пачка отправляется до сводки, чтобы таблица не отставала от счётчика
+        self.flush_matches()
+        self.update_progress.emit(snapshot)
 
     def stop(self):
-        self.is_running = False
+        self.engine.stop()
 
     def run(self):
         try:
-            # Считаем общее количество файлов
-            self.file_count = self.count_files(self.search_path)
-            if self.file_count == 0:
+            self.engine.run()
+            self.flush_matches()
+            # При поиске по имени неподходящие файлы не считаются обработанными
+            if self.engine.is_running and self.engine.processed_files == 0 and self.engine.name_pattern is None:
                 self.error.emit("Файлы с указанными расширениями не найдены")
                 return
-
-            # Рекурсивный поиск
-            self.search_files(self.search_path)
-            self.finished.emit(self.results)
+            self.finished.emit(self.engine.matches_found)
         except Exception as e:
             self.error.emit(f"Ошибка поиска: {str(e)}")
 
-    def count_files(self, path):
-        count = 0
-        for root, _, files in os.walk(path):
-            for file in files:
-                if not self.is_running:
-                    return 0
-                    
-                file_path = os.path.join(root, file)
-                # Пропускаем скрытые файлы/папки
-                if any(part.startswith('.') for part in file_path.split(os.sep)):
-                    continue
-                    
-                ext = os.path.splitext(file)[1].lower()
-                if ext in self.extensions:
-                    try:
-                        # Пропускаем большие файлы
-                        if os.path.getsize(file_path) > self.max_size_bytes:
-                            continue
-                        count += 1
-                    except:
-                        continue
-        return count
-
-    def search_files(self, path):
-        for root, _, files in os.walk(path):
-            if not self.is_running:
-                return
-                
-            for file in files:
-                if not self.is_running:
-                    return
-                    
-                file_path = os.path.join(root, file)
-                
-                # Пропускаем скрытые файлы/папки
-                if any(part.startswith('.') for part in file_path.split(os.sep)):
-                    continue
-                    
-                ext = os.path.splitext(file)[1].lower()
-                
-                if ext in self.extensions:
-                    try:
-                        file_size = os.path.getsize(file_path)
-                        # Пропускаем большие файлы
-                        if file_size > self.max_size_bytes:
-                            continue
-                            
-                        self.processed_files += 1
-                        progress = int((self.processed_files / self.file_count) * 100)
-                        self.update_progress.emit(
-                            progress, 
-                            self.file_count, 
-                            f"Обработка: {file}"
-                        )
-                        
-                        # Получаем дату изменения
-                        modified = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%d.%m.%Y %H:%M")
-                        
-                        # Оптимизированный поиск с использованием mmap
-                        with open(file_path, 'rb') as f:
-                            # Пропускаем бинарные файлы
-                            if self.skip_binary:
-                                try:
-                                    content = f.read(1024)
-                                    if b'\x00' in content:
-                                        continue
-                                    # Возвращаем указатель в начало файла
-                                    f.seek(0)
-                                except:
-                                    continue
-                                
-                            try:
-                                # Используем mmap для быстрого поиска
-                                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                                    text = mm.read().decode('utf-8', errors='ignore').lower()
-                                    
-                                    # Поиск по ключевым словам
-                                    found = False
-                                    if not self.keywords:  # Если ключевых слов нет
-                                        found = True
-                                    elif self.match_type == "any":
-                                        for keyword in self.keywords:
-                                            if keyword in text:
-                                                found = True
-                                                break
-                                    else:  # all
-                                        found = all(keyword in text for keyword in self.keywords)
-                                    
-                                    if found:
-                                        # Форматируем размер файла
-                                        size_str = self.format_size(file_size)
-                                        self.found_match.emit(file_path, file, size_str, modified)
-                                        self.results.append({
-                                            "file_path": file_path,
-                                            "filename": file,
-                                            "size": size_str,
-                                            "modified": modified
-                                        })
-                            except Exception as e:
-                                # Ошибка mmap - пробуем обычный способ
-                                try:
-                                    content = f.read(min(1024*1024, file_size)).decode('utf-8', errors='ignore').lower()
-                                    
-                                    found = False
-                                    if not self.keywords:
-                                        found = True
-                                    elif self.match_type == "any":
-                                        for keyword in self.keywords:
-                                            if keyword in content:
-                                                found = True
-                                                break
-                                    else:  # all
-                                        found = all(keyword in content for keyword in self.keywords)
-                                    
-                                    if found:
-                                        size_str = self.format_size(file_size)
-                                        self.found_match.emit(file_path, file, size_str, modified)
-                                        self.results.append({
-                                            "file_path": file_path,
-                                            "filename": file,
-                                            "size": size_str,
-                                            "modified": modified
-                                        })
-                                except:
-                                    continue
-                    except Exception as e:
-                        continue
-
-    def format_size(self, size):
-        # Конвертируем размер в читаемый формат
-        for unit in ['Б', 'КБ', 'МБ', 'ГБ']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} ТБ"
-
 class ModernCard(QFrame):
     def __init__(self, title="", parent=None):
         super().__init__(parent)
@@ -250,6 +132,224 @@ class ModernCard(QFrame):
             """)
             self.layout.addWidget(title_label)
 
+class SnippetLoader(QThread):
+    # Фрагменты совпадений вычисляются в фоне по запросу модели - только для
+    # строк, которые таблица показывает. Последние запрошенные - первыми
+    snippet_ready = pyqtSignal(int, int, str, str)  # поколение запроса, строка, путь, фрагменты
+
+    # Сколько запросов хранить: прокрученные мимо строки вытесняются
+    MAX_PENDING = 200
+
+    def __init__(self):
+        super().__init__()
+        self.condition = threading.Condition()
+        self.requests = []
+        self.requested = set()
+        self.finder = None
+        self.generation = 0
+        self.is_running = True
+
+    def reset(self, finder):
+        # Новый поиск: прежние запросы больше не нужны
+        with self.condition:
+            self.generation += 1
+            self.finder = finder
+            self.requests.clear()
+            self.requested.clear()
+            return self.generation
+
+    def request(self, path, row):
+        with self.condition:
+            if self.finder is None or path in self.requested:
+                return
+            self.requested.add(path)
+            self.requests.append((path, row))
+            if len(self.requests) > self.MAX_PENDING:
+                self.requested.discard(self.requests.pop(0)[0])
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.is_running and not self.requests:
+                    self.condition.wait()
+                if not self.is_running:
+                    return
+                path, row = self.requests.pop()
+                finder = self.finder
+                generation = self.generation
+            try:
+                text = format_snippets(finder.find(path))
+            except Exception:
+                text = ""
+            with self.condition:
+                # Вытесненный из кэша модели фрагмент можно запросить снова
+                self.requested.discard(path)
+            self.snippet_ready.emit(generation, row, path, text)
+
+
+class ResultsModel(QAbstractTableModel):
+    # Модель таблицы результатов. Хранит только путь, размер, время изменения,
+    # оценку релевантности и группу дубликатов в компактных массивах, строки для отображения
+    # формируются по запросу. Фрагменты совпадений запрашиваются у загрузчика,
+    # когда таблица впервые показывает строку, и хранятся для последних
+    # показанных строк
+    HEADERS = ["Имя файла", "Размер", "Изменен", "Путь", "Оценка", "Фрагмент", "Группа"]
+    SCORE_COLUMN = 4
+    SNIPPET_COLUMN = 5
+    GROUP_COLUMN = 6
+    # Сколько фрагментов хранить: несколько экранов строк
+    MAX_SNIPPETS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.scores = array('d')
+        self.groups = array('q')
+        # Путь -> фрагменты совпадений, давно не показанные вытесняются
+        self.snippets = OrderedDict()
+        self.snippet_generation = 0
+        self.snippet_loader = SnippetLoader()
+        self.snippet_loader.snippet_ready.connect(self.set_snippet)
+        self.snippet_loader.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        path = self.paths[row]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return os.path.basename(path)
+            if column == 1:
+                return format_size(self.sizes[row])
+            if column == 2:
+                return format_modified(self.mtimes[row])
+            if column == self.SCORE_COLUMN:
+                return f"{self.scores[row]:.2f}"
+            if column == self.SNIPPET_COLUMN:
+                return self.snippet(path, row).split('\n', 1)[0]
+            if column == self.GROUP_COLUMN:
+                return str(self.groups[row])
+            return os.path.dirname(path)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if column == 0:
+                return path
+            if column == 3:
+                return os.path.dirname(path)
+            if column == self.SNIPPET_COLUMN:
+                return self.snippets.get(path)
+        if role == Qt.ItemDataRole.UserRole:
+            return path
+        return None
+
+    def file_path(self, row):
+        return self.paths[row]
+
+    def snippet(self, path, row):
+        text = self.snippets.get(path)
+        if text is None:
+            self.snippet_loader.request(path, row)
+            return "…"
+        self.snippets.move_to_end(path)
+        return text
+
+    def set_snippet_finder(self, finder):
+        self.snippets = OrderedDict()
+        self.snippet_generation = self.snippet_loader.reset(finder)
+
+    def set_snippet(self, generation, row, path, text):
+        if generation != self.snippet_generation:
+            return
+        self.snippets[path] = text
+        if len(self.snippets) > self.MAX_SNIPPETS:
+            self.snippets.popitem(last=False)
+        if row >= len(self.paths) or self.paths[row] != path:
+            # Строки пересортированы, пока фрагмент вычислялся
+            try:
+                row = self.paths.index(path)
+            except ValueError:
+                return
+        index = self.index(row, self.SNIPPET_COLUMN)
+        self.dataChanged.emit(index, index)
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for path, size, mtime, score, group in rows:
+            self.paths.append(path)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.scores.append(score)
+            self.groups.append(group)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.paths = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.scores = array('d')
+        self.groups = array('q')
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if column == self.SNIPPET_COLUMN:
+            return
+        paths = self.paths
+        if column == 0:
+            key = lambda i: os.path.basename(paths[i]).lower()
+        elif column == 1:
+            key = self.sizes.__getitem__
+        elif column == 2:
+            key = self.mtimes.__getitem__
+        elif column == self.SCORE_COLUMN:
+            key = self.scores.__getitem__
+        elif column == self.GROUP_COLUMN:
+            key = self.groups.__getitem__
+        else:
+            key = lambda i: os.path.dirname(paths[i]).lower()
+        reverse = order == Qt.SortOrder.DescendingOrder
+
+        self.layoutAboutToBeChanged.emit()
+        permutation = sorted(range(len(paths)), key=key, reverse=reverse)
+        self.paths = [paths[i] for i in permutation]
+        self.sizes = array('q', (self.sizes[i] for i in permutation))
+        self.mtimes = array('d', (self.mtimes[i] for i in permutation))
+        self.scores = array('d', (self.scores[i] for i in permutation))
+        self.groups = array('q', (self.groups[i] for i in permutation))
+
+        # Выделенные строки должны остаться на своих файлах
+        new_rows = [0] * len(permutation)
+        for new_row, old_row in enumerate(permutation):
+            new_rows[old_row] = new_row
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(new_rows[index.row()], index.column()) for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
 class XillenFileFinder(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -321,7 +421,7 @@ class XillenFileFinder(QMainWindow):
         content_layout.setSpacing(20)
         
         # Левая панель - настройки
-        left_panel = QWidget()
+        left_panel = self.left_panel = QWidget()
         left_panel.setMaximumWidth(400)
         left_layout = QVBoxLayout()
         left_layout.setSpacing(15)
@@ -385,6 +485,51 @@ class XillenFileFinder(QMainWindow):
         self.ext_input.setPlaceholderText("Введите расширения через запятую")
         settings_layout.addWidget(self.ext_input)
         
+        # Исключения: папки по шаблону не обходятся целиком
+        settings_layout.addWidget(QLabel("Исключить (шаблоны):"))
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        self.exclude_input.setPlaceholderText("Например: node_modules, build/, *.min.js")
+        self.exclude_input.setToolTip("Шаблоны через запятую в стиле .gitignore. Исключённые папки не обходятся")
+        settings_layout.addWidget(self.exclude_input)
+        
+        settings_layout.addWidget(QLabel("Только файлы (шаблоны):"))
+        self.include_input = QLineEdit()
+        self.include_input.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        self.include_input.setPlaceholderText("Необязательно. Например: src/**, report_*")
+        settings_layout.addWidget(self.include_input)
+        
+        settings_layout.addWidget(QLabel("Имя файла:"))
+        self.name_input = QLineEdit()
+        self.name_input.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        self.name_input.setPlaceholderText("Необязательно. Часть имени или шаблон: отчет, *2024*.xlsx, src/*.py")
+        self.name_input.setToolTip("Без ключевых слов содержимое файлов не читается. С индексом поиск идёт по триграммному индексу путей")
+        settings_layout.addWidget(self.name_input)
+        
         # Ключевые слова
         settings_layout.addWidget(QLabel("Ключевые слова:"))
         self.keyword_input = QLineEdit()
@@ -416,6 +561,23 @@ class XillenFileFinder(QMainWindow):
         """)
         settings_layout.addWidget(self.match_type_combo)
         
+        # Как понимать ключевые слова
+        self.pattern_mode_combo = QComboBox()
+        self.pattern_mode_combo.addItem("Часть текста")
+        self.pattern_mode_combo.addItem("Целые слова")
+        self.pattern_mode_combo.addItem("Регулярные выражения")
+        self.pattern_mode_combo.setToolTip("Целые слова: «log» не найдётся в «catalog». Регулярные выражения - синтаксис Python, без учёта регистра")
+        self.pattern_mode_combo.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        settings_layout.addWidget(self.pattern_mode_combo)
+        
         # Дополнительные настройки
         options_layout = QGridLayout()
         options_layout.setHorizontalSpacing(15)
@@ -442,9 +604,173 @@ class XillenFileFinder(QMainWindow):
         self.skip_binary_check.setChecked(True)
         options_layout.addWidget(self.skip_binary_check, 1, 0, 1, 2)
         
+        # Параллельная обработка
+        options_layout.addWidget(QLabel("Обработчиков:"), 2, 0)
+        
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 256)
+        self.workers_input.setValue(os.cpu_count() or 4)
+        self.workers_input.setStyleSheet(f"""
+            QSpinBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.workers_input, 2, 1)
+        
+        options_layout.addWidget(QLabel("Режим обработки:"), 3, 0)
+        
+        self.pool_type_combo = QComboBox()
+        self.pool_type_combo.addItem("Потоки (диск)")
+        self.pool_type_combo.addItem("Процессы (CPU)")
+        self.pool_type_combo.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.pool_type_combo, 3, 1)
+        
+        # Кэш извлечённого текста документов
+        options_layout.addWidget(QLabel("Кэш текста (МБ):"), 5, 0)
+        
+        self.text_cache_input = QComboBox()
+        self.text_cache_input.addItems(["0", "128", "512", "1024", "4096"])
+        self.text_cache_input.setCurrentText("512")
+        self.text_cache_input.setToolTip("Текст, извлечённый из DOCX, XLSX, PPTX и PDF, сохраняется между поисками. 0 - отключить")
+        self.text_cache_input.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.text_cache_input, 5, 1)
+        
+        # Индекс для повторных поисков
+        self.use_index_check = QCheckBox("Использовать индекс")
+        self.use_index_check.setToolTip("Повторные поиски по той же папке отвечаются по индексу, читаются только изменённые файлы")
+        options_layout.addWidget(self.use_index_check, 4, 0, 1, 2)
+        
+        # Отчёт профилировщика для разбора медленных поисков
+        self.profile_check = QCheckBox("Профилировать поиск")
+        self.profile_check.setToolTip("Отчёт cProfile сохраняется в папку profiles. Обработка идёт в одном потоке, поиск медленнее")
+        options_layout.addWidget(self.profile_check, 6, 0, 1, 2)
+        
+        # Правила .gitignore в папках поиска
+        self.gitignore_check = QCheckBox("Учитывать .gitignore")
+        self.gitignore_check.setToolTip("Файлы и папки, исключённые правилами .gitignore, не проверяются")
+        options_layout.addWidget(self.gitignore_check, 7, 0, 1, 2)
+        
+        # Ранжирование по релевантности (BM25)
+        options_layout.addWidget(QLabel("Лучшие по релевантности:"), 8, 0)
+        
+        self.top_k_input = QComboBox()
+        self.top_k_input.addItems(["Все", "100", "1000", "10000"])
+        self.top_k_input.setToolTip("Файлы оцениваются по частоте ключевых слов, показываются лучшие после завершения поиска. Все - без ранжирования, по мере нахождения")
+        self.top_k_input.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.top_k_input, 8, 1)
+        
+        # Кодировки текстовых файлов
+        options_layout.addWidget(QLabel("Кодировки:"), 9, 0)
+        
+        self.encodings_input = QComboBox()
+        self.encodings_input.setEditable(True)
+        self.encodings_input.addItems(["utf-8", "utf-8, cp1251", "utf-8, cp1251, koi8-r, utf-16"])
+        self.encodings_input.setToolTip("Кодировки через запятую. Кодировка файла определяется по его началу, ключевые слова ищутся в байтах файла без декодирования")
+        self.encodings_input.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.encodings_input, 9, 1)
+        
+        # Поиск дубликатов вместо поиска по содержимому
+        self.duplicates_check = QCheckBox("Найти дубликаты")
+        self.duplicates_check.setToolTip("Ключевые слова не учитываются. Файлы сравниваются по размеру, затем по началу и концу, и только затем целиком - большинство файлов не читается")
+        options_layout.addWidget(self.duplicates_check, 10, 0, 1, 2)
+        
+        # Порядок чтения файлов (для дисков с механикой и RAID)
+        options_layout.addWidget(QLabel("Порядок чтения:"), 11, 0)
+        
+        self.io_order_combo = QComboBox()
+        self.io_order_combo.addItem("Порядок обхода")
+        self.io_order_combo.addItem("По inode")
+        self.io_order_combo.addItem("По размещению на диске")
+        self.io_order_combo.setToolTip("Найденные файлы читаются пачками в порядке размещения на диске - меньше перемещений головок на HDD. Для SSD не нужно")
+        self.io_order_combo.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {CURRENT_THEME['input']}; 
+                color: {CURRENT_THEME['input_text']};
+                border: 1px solid {CURRENT_THEME['border']};
+                border-radius: 4px;
+                padding: 5px;
+            }}
+        """)
+        options_layout.addWidget(self.io_order_combo, 11, 1)
+        
+        # Подсказки ядру о чтении
+        self.cache_hints_check = QCheckBox("Не вытеснять кэш ОС")
+        self.cache_hints_check.setToolTip("Прочитанные файлы сразу освобождаются из кэша ОС (posix_fadvise), чтобы большой поиск не вытеснял данные других программ")
+        self.cache_hints_check.setEnabled(HAS_FADVISE)
+        options_layout.addWidget(self.cache_hints_check, 12, 0, 1, 2)
+        
+        # Журнал поиска для продолжения после остановки или сбоя
+        self.checkpoint_check = QCheckBox("Сохранять состояние поиска")
+        self.checkpoint_check.setToolTip("Раз в 30 секунд состояние поиска записывается на диск, чтобы долгий поиск можно было продолжить после остановки или сбоя")
+        options_layout.addWidget(self.checkpoint_check, 13, 0, 1, 2)
+        
+        # Продолжение остановленного или прерванного поиска
+        self.resume_check = QCheckBox("Продолжить прерванный поиск")
+        self.resume_check.setToolTip("Поиск с теми же параметрами продолжится с места остановки, проверенные файлы не читаются повторно")
+        options_layout.addWidget(self.resume_check, 14, 0, 1, 2)
+        
+        # Кэш результатов повторяющихся запросов
+        self.query_cache_check = QCheckBox("Кэшировать результаты")
+        self.query_cache_check.setToolTip("При повторе того же запроса заново читаются только изменённые папки и файлы, остальные ответы берутся из кэша")
+        options_layout.addWidget(self.query_cache_check, 15, 0, 1, 2)
+        
+        # Потоковая выгрузка найденных файлов во время поиска
+        self.stream_export_check = QCheckBox("Записывать найденные в файл")
+        self.stream_export_check.setToolTip("Найденные файлы пишутся в CSV, JSON Lines или двоичный файл по мере нахождения, с исходными размером и временем изменения")
+        options_layout.addWidget(self.stream_export_check, 16, 0, 1, 2)
+        
         settings_layout.addLayout(options_layout)
         
-        left_layout.addWidget(settings_card)
+        # Списки не расширяют панель по длине своих пунктов
+        for combo in settings_card.findChildren(QComboBox):
+            combo.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+            combo.setMinimumContentsLength(6)
+        
+        # Настроек больше, чем помещается по высоте окна: карточка прокручивается,
+        # а управление поиском остаётся видимым под ней
+        settings_scroll = self.settings_scroll = QScrollArea()
+        settings_scroll.setWidget(settings_card)
+        settings_scroll.setWidgetResizable(True)
+        settings_scroll.setFrameShape(QFrame.Shape.NoFrame)
+        settings_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        settings_scroll.setStyleSheet("QScrollArea { background: transparent; } QScrollArea > QWidget > QWidget { background: transparent; }")
+        left_layout.addWidget(settings_scroll, 1)
         
         # Карточка управления
         control_card = ModernCard("Управление поиском")
@@ -529,7 +855,6 @@ class XillenFileFinder(QMainWindow):
         control_layout.addWidget(self.stats_label)
         
         left_layout.addWidget(control_card)
-        left_layout.addStretch()
         
         # Правая панель - результаты
         right_panel = QWidget()
@@ -543,16 +868,30 @@ class XillenFileFinder(QMainWindow):
         results_layout = QVBoxLayout()
         results_card.layout.addLayout(results_layout)
         
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(4)
-        self.results_table.setHorizontalHeaderLabels(["Имя файла", "Размер", "Изменен", "Путь"])
+        self.results_model = ResultsModel(self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        # Размеры колонок не пересчитываются по содержимому - это дорого на миллионах строк
         self.results_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
-        self.results_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        self.results_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.results_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
+        self.results_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Interactive)
         self.results_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.results_table.setColumnWidth(1, 100)
+        self.results_table.setColumnWidth(2, 140)
+        self.results_table.horizontalHeader().setSectionResizeMode(ResultsModel.SCORE_COLUMN, QHeaderView.ResizeMode.Interactive)
+        self.results_table.setColumnWidth(ResultsModel.SCORE_COLUMN, 80)
+        self.results_table.setColumnHidden(ResultsModel.SCORE_COLUMN, True)
+        self.results_table.horizontalHeader().setSectionResizeMode(ResultsModel.SNIPPET_COLUMN, QHeaderView.ResizeMode.Stretch)
+        self.results_table.setColumnHidden(ResultsModel.SNIPPET_COLUMN, True)
+        self.results_table.horizontalHeader().setSectionResizeMode(ResultsModel.GROUP_COLUMN, QHeaderView.ResizeMode.Interactive)
+        self.results_table.setColumnWidth(ResultsModel.GROUP_COLUMN, 70)
+        self.results_table.setColumnHidden(ResultsModel.GROUP_COLUMN, True)
+        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.results_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.results_table.verticalHeader().setVisible(False)
+        self.results_table.setSortingEnabled(True)
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
         self.results_table.doubleClicked.connect(self.open_file)
         
         results_layout.addWidget(self.results_table)
@@ -632,6 +971,7 @@ class XillenFileFinder(QMainWindow):
         self.search_thread = None
         self.start_time = None
         self.current_path = ""
+        self.index_watcher = None
         
         # Применение темы
         self.apply_theme()
@@ -699,7 +1039,7 @@ class XillenFileFinder(QMainWindow):
                 border-radius: 4px;
                 padding: 5px;
             }}
-            QTableWidget {{
+            QTableView {{
                 background-color: {CURRENT_THEME['dialog']};
                 color: {CURRENT_THEME['text']};
                 gridline-color: {CURRENT_THEME['border']};
@@ -752,6 +1092,16 @@ class XillenFileFinder(QMainWindow):
         """)
         
         self.results_table.setAlternatingRowColors(True)
+        if self.isVisible():
+            self.fit_settings_panel()
+
+    def fit_settings_panel(self):
+        # Ширина панели - по карточке настроек и полосе прокрутки, чтобы ничего
+        # не обрезалось справа. Размеры известны только у показанного окна
+        card = self.settings_scroll.widget()
+        width = card.minimumSizeHint().width() + self.settings_scroll.verticalScrollBar().sizeHint().width()
+        self.settings_scroll.setMinimumWidth(width)
+        self.left_panel.setMaximumWidth(max(width, 400))
 
     def create_icon(self):
         # Уменьшенный размер иконки для решения проблемы Wayland
@@ -795,6 +1145,28 @@ class XillenFileFinder(QMainWindow):
         max_size_mb = int(self.max_size_input.currentText().strip())
         skip_binary = self.skip_binary_check.isChecked()
         match_type = "any" if self.match_type_combo.currentIndex() == 0 else "all"
+        pattern_mode = PATTERN_MODES[self.pattern_mode_combo.currentIndex()]
+        exclude = self.exclude_input.text().strip()
+        include = self.include_input.text().strip()
+        name_pattern = self.name_input.text().strip()
+        use_gitignore = self.gitignore_check.isChecked()
+        top_k = 0 if self.top_k_input.currentIndex() == 0 else int(self.top_k_input.currentText())
+        encodings = self.encodings_input.currentText().strip()
+        duplicates = self.duplicates_check.isChecked()
+        io_order = IO_ORDERS[self.io_order_combo.currentIndex()]
+        cache_hints = self.cache_hints_check.isChecked()
+        checkpoint = self.checkpoint_check.isChecked()
+        resume = self.resume_check.isChecked()
+        query_cache = self.query_cache_check.isChecked()
+        if duplicates:
+            keywords = ""
+        workers = self.workers_input.value()
+        pool_type = "thread" if self.pool_type_combo.currentIndex() == 0 else "process"
+        use_index = self.use_index_check.isChecked()
+        text_cache_mb = int(self.text_cache_input.currentText())
+        profile_path = None
+        if self.profile_check.isChecked():
+            profile_path = os.path.join(data_dir("profiles"), time.strftime("search-%Y%m%d-%H%M%S.txt"))
         
         if not search_path:
             self.show_error("Пожалуйста, выберите папку для поиска")
@@ -808,8 +1180,36 @@ class XillenFileFinder(QMainWindow):
             self.show_error("Пожалуйста, укажите расширения файлов")
             return
             
+        if pattern_mode == "regex":
+            try:
+                create_matcher(split_keywords(keywords, pattern_mode), match_type, pattern_mode)
+            except ValueError as e:
+                self.show_error(str(e))
+                return
+        
+        try:
+            encoding_list = normalize_encodings(encodings)
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        
+        export_path = ""
+        if self.stream_export_check.isChecked():
+            export_path, _ = QFileDialog.getSaveFileName(
+                self, "Записывать найденные в файл", "xillen_results.csv",
+                "CSV Files (*.csv);;JSON Lines (*.jsonl);;Двоичный формат (*.bin)")
+            if not export_path:
+                return
+            try:
+                export_format_for(export_path)
+            except ValueError as e:
+                self.show_error(str(e))
+                return
+            
         # Сброс таблицы
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
+        self.results_model.set_snippet_finder(SnippetFinder(keywords, pattern_mode, encoding_list) if keywords else None)
+        self.results_table.setColumnHidden(ResultsModel.SNIPPET_COLUMN, not keywords)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.search_btn.setEnabled(False)
@@ -820,6 +1220,12 @@ class XillenFileFinder(QMainWindow):
         self.status_label.setStyleSheet(f"background-color: {CURRENT_THEME['card']}; color: {CURRENT_THEME['button']};")
         self.start_time = time.time()
         
+        # Наблюдение за папкой поддерживает индекс актуальным между поисками
+        if use_index:
+            self.start_index_watcher(search_path)
+        else:
+            self.stop_index_watcher()
+        
         # Запуск потока поиска
         self.search_thread = FileSearchWorker(
             search_path,
@@ -827,97 +1233,138 @@ class XillenFileFinder(QMainWindow):
             keywords,
             max_size_mb,
             skip_binary,
-            match_type
+            match_type,
+            workers=workers,
+            pool_type=pool_type,
+            use_index=use_index,
+            index_watcher=self.index_watcher,
+            text_cache_mb=text_cache_mb,
+            profile_path=profile_path,
+            pattern_mode=pattern_mode,
+            exclude=exclude,
+            include=include,
+            use_gitignore=use_gitignore,
+            top_k=top_k,
+            encodings=encodings,
+            duplicates=duplicates,
+            name_pattern=name_pattern,
+            io_order=io_order,
+            cache_hints=cache_hints,
+            checkpoint=checkpoint,
+            resume=resume,
+            query_cache=query_cache,
+            export_path=export_path
         )
+        self.results_table.setColumnHidden(ResultsModel.SCORE_COLUMN, self.search_thread.engine.top_results is None)
+        self.results_table.setColumnHidden(ResultsModel.GROUP_COLUMN, not duplicates)
         self.search_thread.update_progress.connect(self.update_progress)
         self.search_thread.finished.connect(self.search_finished)
         self.search_thread.error.connect(self.show_error)
-        self.search_thread.found_match.connect(self.add_result_row)
+        self.search_thread.found_matches.connect(self.add_result_rows)
         self.search_thread.start()
 
+    def start_index_watcher(self, search_path):
+        if self.index_watcher is not None and self.index_watcher.root == os.path.abspath(search_path):
+            return
+        self.stop_index_watcher()
+        self.index_watcher = IndexWatcher(search_path)
+        self.index_watcher.start()
+
+    def stop_index_watcher(self):
+        if self.index_watcher is not None:
+            self.index_watcher.stop()
+            self.index_watcher = None
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.fit_settings_panel()
+
+    def closeEvent(self, event):
+        if self.search_thread and self.search_thread.isRunning():
+            self.search_thread.stop()
+            self.search_thread.wait()
+        self.stop_index_watcher()
+        self.results_model.snippet_loader.stop()
+        super().closeEvent(event)
+
     def stop_search(self):
         if self.search_thread and self.search_thread.isRunning():
             self.search_thread.stop()
             self.search_thread.wait()
             self.search_btn.setEnabled(True)
             self.stop_btn.setEnabled(False)
-            self.status_label.setText("Поиск остановлен пользователем")
+            stopped = "Поиск остановлен пользователем"
+            if self.search_thread.engine.journal is not None:
+                stopped += ". Его можно продолжить: «Продолжить прерванный поиск»"
+            self.status_label.setText(stopped)
             self.status_label.setStyleSheet(f"background-color: {CURRENT_THEME['card']}; color: {CURRENT_THEME['error']};")
 
-    def update_progress(self, progress, total_files, message):
+    def update_progress(self, snapshot):
+        progress = snapshot["progress"]
+        processed = snapshot["files"]
         self.progress_bar.setValue(progress)
-        self.progress_bar.setFormat(f"{message} ({progress}%)")
+        directory = os.path.basename(snapshot["directory"]) or snapshot["directory"]
+        self.progress_bar.setFormat(f"Обработка: {directory} ({progress}%)")
         
         elapsed = time.time() - self.start_time
-        files_per_sec = self.search_thread.processed_files / elapsed if elapsed > 0 else 0
+        files_per_sec = processed / elapsed if elapsed > 0 else 0
         remaining = (100 - progress) * elapsed / progress if progress > 0 else 0
         
         self.stats_label.setText(
-            f"Обработано: {self.search_thread.processed_files}/{total_files} файлов | "
+            f"Обработано: {processed}/{snapshot['total']} файлов ({format_size(snapshot['bytes'])}) | "
             f"Скорость: {files_per_sec:.1f} файл/сек | "
             f"Осталось: {remaining:.1f} сек | "
-            f"Найдено: {self.results_table.rowCount()}"
+            f"Найдено: {snapshot['matches']}"
+            + (f"\nЭтапы: {snapshot['stages']}" if snapshot['stages'] else "")
         )
 
-    def add_result_row(self, file_path, filename, size, modified):
-        row = self.results_table.rowCount()
-        self.results_table.insertRow(row)
-        
-        # Имя файла
-        file_item = QTableWidgetItem(filename)
-        file_item.setData(Qt.ItemDataRole.UserRole, file_path)
-        file_item.setToolTip(file_path)
-        self.results_table.setItem(row, 0, file_item)
-        
-        # Размер
-        size_item = QTableWidgetItem(size)
-        self.results_table.setItem(row, 1, size_item)
-        
-        # Дата изменения
-        modified_item = QTableWidgetItem(modified)
-        self.results_table.setItem(row, 2, modified_item)
-        
-        # Путь
-        path = os.path.dirname(file_path)
-        path_item = QTableWidgetItem(path)
-        path_item.setToolTip(path)
-        self.results_table.setItem(row, 3, path_item)
+    def add_result_rows(self, rows):
+        self.results_model.append_rows(rows)
         
         # Активируем кнопки
         self.export_csv_btn.setEnabled(True)
         self.open_file_btn.setEnabled(True)
 
-    def search_finished(self, results):
+    def search_finished(self, found_count):
         self.progress_bar.setVisible(False)
         self.search_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
-        self.export_csv_btn.setEnabled(len(results) > 0)
-        self.open_file_btn.setEnabled(len(results) > 0)
+        self.export_csv_btn.setEnabled(found_count > 0)
+        self.open_file_btn.setEnabled(found_count > 0)
         
         elapsed = time.time() - self.start_time
         files_per_sec = self.search_thread.processed_files / elapsed if elapsed > 0 else 0
         
-        self.status_label.setText(
-            f"Поиск завершен! Найдено файлов: {len(results)} | "
+        engine = self.search_thread.engine
+        shown = self.results_model.rowCount()
+        found_text = f"{found_count} (показаны лучшие {shown})" if shown < found_count else f"{found_count}"
+        summary = (
+            f"Поиск завершен! Найдено файлов: {found_text} | "
             f"Время: {elapsed:.1f} сек | "
             f"Скорость: {files_per_sec:.1f} файл/сек"
         )
+        stages = engine.timings.summary()
+        if stages:
+            summary += f"\nЭтапы: {stages}"
+        if engine.duplicates:
+            summary += f"\nГрупп дубликатов: {engine.duplicate_groups}, прочитано {format_size(engine.processed_bytes)}"
+        if engine.profile_path:
+            summary += f"\nОтчёт профилировщика: {engine.profile_path}"
+        self.status_label.setText(summary)
         self.status_label.setStyleSheet(f"background-color: {CURRENT_THEME['card']}; color: {CURRENT_THEME['success']};")
         
-        if not results:
-            QMessageBox.information(self, "Поиск завершен", "Файлы с указанным текстом не найдены")
+        if not found_count:
+            message = "Дубликаты не найдены" if engine.duplicates else "Файлы с указанным текстом не найдены"
+            QMessageBox.information(self, "Поиск завершен", message)
 
     def open_file(self, index):
         if index.isValid():
-            file_path = self.results_table.item(index.row(), 0).data(Qt.ItemDataRole.UserRole)
-            self.open_file_path(file_path)
+            self.open_file_path(self.results_model.file_path(index.row()))
 
     def open_selected_file(self):
-        selected = self.results_table.selectedItems()
+        selected = self.results_table.selectionModel().selectedRows()
         if selected:
-            row = selected[0].row()
-            file_path = self.results_table.item(row, 0).data(Qt.ItemDataRole.UserRole)
-            self.open_file_path(file_path)
+            self.open_file_path(self.results_model.file_path(selected[0].row()))
 
     def open_file_path(self, file_path):
         try:
@@ -958,12 +1405,15 @@ class XillenFileFinder(QMainWindow):
                 writer = csv.writer(file, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
                 writer.writerow(["Файл", "Размер", "Изменен", "Путь"])
                 
-                for row in range(self.results_table.rowCount()):
-                    filename = self.results_table.item(row, 0).text()
-                    size = self.results_table.item(row, 1).text()
-                    modified = self.results_table.item(row, 2).text()
-                    path = self.results_table.item(row, 3).text()
-                    writer.writerow([filename, size, modified, path])
+                model = self.results_model
+                for row in range(model.rowCount()):
+                    file_path = model.file_path(row)
+                    writer.writerow([
+                        os.path.basename(file_path),
+                        format_size(model.sizes[row]),
+                        format_modified(model.mtimes[row]),
+                        os.path.dirname(file_path)
+                    ])
                     
             QMessageBox.information(self, "Успех", f"Данные экспортированы в {filename}")
         except Exception as e:
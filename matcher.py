@@ -0,0 +1,388 @@
+import re
+from collections import deque
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# С какого числа ключевых слов автомат выгоднее, чем поиск каждого слова через `in`.
+# Автомат проходит текст один раз независимо от числа слов (~125 мс на 1,37 млн
+# символов), `in` - по разу на слово (~1,1 мс на слово). Замеры на тексте
+# make_text из benchmark.py, AND и OR по отсутствующим словам: 64 слова -
+# 135 мс против 75 мс, 112 - 129 против 122, 128 - 93 против 145, 200 - 126
+# против 236. Точка безубыточности - 110-120 слов
+AUTOMATON_MIN_KEYWORDS = 128
+
+# Режимы ключевых слов: подстрока, целое слово, регулярное выражение
+PATTERN_MODES = ("text", "word", "regex")
+
+# Совпадение регулярного выражения длиннее этого (символов) может быть
+# пропущено, если оно попало на границу фрагментов текста
+REGEX_MAX_SPAN = 4096
+# Сколько символов слева от хвоста фрагмента сохранять для проверок назад
+# ((?<!...), \b, ^): с ними граница фрагмента не выглядит началом текста
+REGEX_LEFT_CONTEXT = 256
+REGEX_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Операции разбора выражения, которые не занимают символов текста
+ZERO_WIDTH_OPS = (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+GROUPREF_OPS = (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS)
+
+
+def split_keywords(text, pattern_mode="text"):
+    # Ключевые слова через запятую. Регулярные выражения не приводятся
+    # к нижнему регистру (\w и \W различаются), а запятая внутри скобок
+    # или экранированная запятая выражения не разделяет
+    if pattern_mode != "regex":
+        return [kw.strip().lower() for kw in text.split(',') if kw.strip()]
+
+    keywords = []
+    current = []
+    depth = 0
+    escaped = False
+    for ch in text:
+        if escaped:
+            current.append(ch)
+            escaped = False
+            continue
+        if ch == '\\':
+            escaped = True
+        elif ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth = max(depth - 1, 0)
+        elif ch == ',' and depth == 0:
+            keywords.append(''.join(current))
+            current = []
+            continue
+        current.append(ch)
+    keywords.append(''.join(current))
+    return [kw.strip() for kw in keywords if kw.strip()]
+
+
+def literal_runs(items):
+    # Подстроки, которые входят в любое совпадение разобранного выражения
+    runs = []
+    current = []
+    for op, arg in items:
+        if op is sre_constants.LITERAL:
+            current.append(chr(arg))
+            continue
+        if op in ZERO_WIDTH_OPS:
+            # Якоря и проверки не прерывают последовательность символов
+            continue
+        if current:
+            runs.append(''.join(current))
+            current = []
+        if op is sre_constants.SUBPATTERN:
+            runs.extend(literal_runs(arg[-1]))
+        elif op in REPEAT_OPS and arg[0] >= 1:
+            runs.extend(literal_runs(arg[2]))
+    if current:
+        runs.append(''.join(current))
+    return runs
+
+
+def required_literal(pattern):
+    # Самая длинная подстрока (в нижнем регистре), без которой выражение
+    # не может совпасть, или '' - если такой нет
+    try:
+        runs = literal_runs(sre_parse.parse(pattern))
+    except (re.error, RecursionError):
+        return ''
+    return max(runs, key=len, default='').lower()
+
+
+def subpatterns(arg):
+    # Вложенные части разобранного выражения (группы, альтернативы, повторы)
+    if isinstance(arg, sre_parse.SubPattern):
+        yield arg
+    elif isinstance(arg, (list, tuple)):
+        for value in arg:
+            yield from subpatterns(value)
+
+
+def has_group_references(items):
+    # Есть ли в выражении ссылки на группы (\1, (?(1)...)) - такие выражения
+    # нельзя объединять: номера групп сдвинутся
+    return any(
+        op in GROUPREF_OPS or any(has_group_references(sub) for sub in subpatterns(arg))
+        for op, arg in items
+    )
+
+
+def create_matcher(keywords, match_type, pattern_mode="text"):
+    if pattern_mode == "text" or not keywords:
+        return KeywordMatcher(keywords, match_type)
+    return PatternMatcher(keywords, match_type, pattern_mode)
+
+
+class KeywordMatcher:
+    # Поиск всех ключевых слов за один проход по тексту (автомат Ахо-Корасик).
+    # Найденные слова хранятся битовой маской: бит i - найдено слово keywords[i]
+
+    def __init__(self, keywords, match_type):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.match_type = match_type
+        self.full_mask = (1 << len(self.keywords)) - 1
+        self.use_automaton = len(self.keywords) >= AUTOMATON_MIN_KEYWORDS
+        # Сколько символов предыдущего фрагмента нужно, чтобы не пропустить
+        # слово на границе фрагментов при поиске через `in`
+        self.overlap = max((len(k) for k in self.keywords), default=1) - 1
+        self.delta = None
+        self.output = None
+        if self.use_automaton:
+            self.build_automaton()
+
+    def build_automaton(self):
+        # Бор ключевых слов
+        goto = [{}]
+        output = [0]
+        for i, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    output.append(0)
+                    nxt = len(goto) - 1
+                    goto[state][ch] = nxt
+                state = nxt
+            output[state] |= 1 << i
+
+        # Суффиксные ссылки в порядке обхода в ширину
+        fail = [0] * len(goto)
+        order = []
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] |= output[fail[nxt]]
+
+        # Полная таблица переходов, чтобы при сканировании не ходить по ссылкам
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        for state in order:
+            transitions = dict(delta[fail[state]])
+            transitions.update(goto[state])
+            delta[state] = transitions
+
+        self.delta = delta
+        self.output = output
+
+    def is_decided(self, found):
+        # Ответ известен: для OR найдено хотя бы одно слово, для AND - все
+        if self.match_type == "any":
+            return found != 0
+        return found == self.full_mask
+
+    def is_match(self, found):
+        if not self.keywords:
+            return True
+        return self.is_decided(found)
+
+    def feed(self, text, found=0, state=0):
+        # Возвращает (маска найденных слов, состояние).
+        # Состояние позволяет продолжить поиск в следующем фрагменте текста:
+        # для автомата это номер узла, для поиска через `in` - хвост фрагмента
+        if not self.keywords or self.is_decided(found):
+            return found, state
+
+        if not self.use_automaton:
+            if state:
+                text = state + text
+            for i, keyword in enumerate(self.keywords):
+                if not found >> i & 1 and keyword in text:
+                    found |= 1 << i
+                    if self.is_decided(found):
+                        break
+            return found, text[-self.overlap:] if self.overlap else text[:0]
+
+        delta = self.delta
+        output = self.output
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                found |= output[state]
+                if self.is_decided(found):
+                    break
+        return found, state
+
+    def finish(self, found, state):
+        # Конец текста: для подстрок всё найдено при вызовах feed
+        return found
+
+    def count(self, text, counts, state=''):
+        # Число вхождений каждого слова (для ранжирования). Вхождение на границе
+        # фрагментов считается один раз: от прошлого фрагмента для каждого слова
+        # берётся на символ меньше его длины, целиком слово там не поместится
+        for i, keyword in enumerate(self.keywords):
+            keep = len(keyword) - 1
+            window = state[len(state) - keep:] + text if keep and state else text
+            counts[i] += window.count(keyword)
+        if not self.overlap:
+            return counts, ''
+        if len(text) >= self.overlap:
+            return counts, text[-self.overlap:]
+        return counts, (state + text)[-self.overlap:]
+
+    def count_finish(self, counts, state):
+        return counts
+
+    def matches(self, text):
+        found, state = self.feed(text)
+        return self.is_match(self.finish(found, state))
+
+
+class PatternMatcher:
+    # Поиск по регулярным выражениям и целым словам. Выражения компилируются
+    # один раз на весь поиск; для OR - в одно выражение с альтернативами.
+    # Обязательные подстроки выражений ищутся быстрым KeywordMatcher, и
+    # регулярное выражение запускается только там, где они есть
+
+    def __init__(self, keywords, match_type, pattern_mode):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.match_type = match_type
+        self.pattern_mode = pattern_mode
+        self.full_mask = (1 << len(self.keywords)) - 1
+
+        if pattern_mode == "word":
+            # Слово не должно продолжаться буквенно-цифровыми символами с обеих сторон
+            sources = [r'(?<!\w)' + re.escape(kw) + r'(?!\w)' for kw in self.keywords]
+            literals = [kw.lower() for kw in self.keywords]
+            # Длина слова плюс соседний символ для проверки границы
+            self.span = max(len(kw) for kw in self.keywords) + 1
+            self.left_context = 1
+        else:
+            sources = self.keywords
+            literals = [required_literal(kw) for kw in self.keywords]
+            self.span = REGEX_MAX_SPAN
+            self.left_context = REGEX_LEFT_CONTEXT
+
+        self.patterns = []
+        for keyword, source in zip(self.keywords, sources):
+            try:
+                self.patterns.append(re.compile(source, REGEX_FLAGS))
+            except re.error as e:
+                raise ValueError(f"Ошибка в регулярном выражении «{keyword}»: {e}")
+
+        self.combined = None
+        if match_type == "any" and len(self.patterns) > 1:
+            try:
+                if not any(has_group_references(sre_parse.parse(source)) for source in sources):
+                    self.combined = re.compile(
+                        '|'.join(f'(?P<k{i}>{source})' for i, source in enumerate(sources)),
+                        REGEX_FLAGS
+                    )
+            except re.error:
+                # Например, одинаковые имена групп в разных выражениях
+                self.combined = None
+
+        # Предварительный фильтр: какие обязательные подстроки есть во фрагменте.
+        # Выражения без обязательной подстроки проверяются всегда
+        unique = list(dict.fromkeys(literal for literal in literals if literal))
+        self.prefilter = KeywordMatcher(unique, "all") if unique else None
+        self.literal_bits = [1 << unique.index(literal) if literal else 0 for literal in literals]
+        self.unfiltered = any(not literal for literal in literals)
+
+    def is_decided(self, found):
+        if self.match_type == "any":
+            return found != 0
+        return found == self.full_mask
+
+    def is_match(self, found):
+        if not self.keywords:
+            return True
+        return self.is_decided(found)
+
+    def feed(self, text, found=0, state=0):
+        # Состояние - хвост предыдущего фрагмента: в нём начинаются совпадения,
+        # которые могут продолжиться в следующем фрагменте. Перед хвостом
+        # сохраняется left_context символов: совпадения в них не ищутся, но
+        # проверки назад видят настоящий текст слева
+        if not self.keywords or self.is_decided(found):
+            return found, state
+        window = state + text if state else text
+        found = self.search(window, found, final=False, pos=self.tail_start(state))
+        return found, window[-self.span - 1 - self.left_context:]
+
+    def finish(self, found, state):
+        # Конец текста: совпадения в хвосте последнего фрагмента окончательны
+        if state and not self.is_decided(found):
+            found = self.search(state, found, final=True, pos=self.tail_start(state))
+        return found
+
+    def tail_start(self, state):
+        # Начало хвоста в состоянии: всё левее - только контекст
+        return max(len(state) - self.span - 1, 0) if state else 0
+
+    def search(self, window, found, final, pos=0):
+        present = self.prefilter.feed(window)[0] if self.prefilter is not None else 0
+        if not present and not self.unfiltered:
+            return found
+        # Совпадение у самого конца фрагмента может оказаться другим, когда
+        # придёт продолжение текста, - его проверяем в следующем фрагменте
+        limit = None if final else len(window)
+
+        if self.combined is not None:
+            for m in self.combined.finditer(window, pos):
+                if limit is None or m.end() < limit:
+                    return found | 1 << int(m.lastgroup[1:])
+            return found
+
+        for i, pattern in enumerate(self.patterns):
+            if found >> i & 1:
+                continue
+            bit = self.literal_bits[i]
+            if bit and not present & bit:
+                continue
+            for m in pattern.finditer(window, pos):
+                if limit is None or m.end() < limit:
+                    found |= 1 << i
+                    break
+            if self.is_decided(found):
+                break
+        return found
+
+    def count(self, text, counts, state=''):
+        # Число совпадений каждого выражения. Совпадения, закончившиеся в хвосте
+        # прошлого фрагмента, уже учтены; совпадение у конца фрагмента
+        # откладывается до следующего фрагмента
+        window = state + text if state else text
+        self.count_window(window, counts, len(state), final=False, pos=self.tail_start(state))
+        return counts, window[-self.span - 1 - self.left_context:]
+
+    def count_finish(self, counts, state):
+        if state:
+            self.count_window(state, counts, len(state), final=True, pos=self.tail_start(state))
+        return counts
+
+    def count_window(self, window, counts, start, final, pos=0):
+        present = self.prefilter.feed(window)[0] if self.prefilter is not None else 0
+        if not present and not self.unfiltered:
+            return
+        limit = len(window)
+        for i, pattern in enumerate(self.patterns):
+            bit = self.literal_bits[i]
+            if bit and not present & bit:
+                continue
+            for m in pattern.finditer(window, pos):
+                if m.end() >= start and (final or m.end() < limit):
+                    counts[i] += 1
+
+    def matches(self, text):
+        found, state = self.feed(text)
+        return self.is_match(self.finish(found, state))
@@ -0,0 +1,151 @@
+import os
+import re
+
+# Файл правил исключения в стиле git
+GITIGNORE = ".gitignore"
+
+
+def split_patterns(text):
+    # Шаблоны через запятую
+    return [p.strip() for p in text.split(',') if p.strip()]
+
+
+def glob_to_regex(pattern):
+    # Шаблон в стиле .gitignore -> регулярное выражение для пути относительно
+    # папки правила (разделитель '/'). Шаблон без '/' подходит к имени на любом
+    # уровне, '**' - любое число папок, '*' и '?' не переходят через '/'
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        if ch == '*':
+            out.append('[^/]*')
+        elif ch == '?':
+            out.append('[^/]')
+        elif ch == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                out.append(re.escape(ch))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif ch == '\\' and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    body = ''.join(out)
+    return body if anchored else '(?:.*/)?' + body
+
+
+def compile_rules(patterns):
+    # Все шаблоны - в одно регулярное выражение (None, если шаблонов нет)
+    if not patterns:
+        return None
+    return re.compile('(?:' + '|'.join(glob_to_regex(p) for p in patterns) + ')\\Z', re.IGNORECASE if os.name == 'nt' else 0)
+
+
+class RuleSet:
+    # Правила одного источника (параметры поиска или один .gitignore).
+    # Пути проверяются относительно папки base. Правило с '!' возвращает
+    # исключённое обратно, правило с '/' на конце относится только к папкам
+
+    def __init__(self, lines, base=''):
+        self.base = base
+        files, dirs, keep_files, keep_dirs = [], [], [], []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            target_dirs = keep_dirs if negated else dirs
+            target_dirs.append(line)
+            if not dir_only:
+                (keep_files if negated else files).append(line)
+        self.files = compile_rules(files)
+        self.dirs = compile_rules(dirs)
+        self.keep_files = compile_rules(keep_files)
+        self.keep_dirs = compile_rules(keep_dirs)
+
+    def is_empty(self):
+        return self.files is None and self.dirs is None
+
+    def excludes(self, rel_path, is_dir):
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        rules, keep = (self.dirs, self.keep_dirs) if is_dir else (self.files, self.keep_files)
+        if rules is None or not rules.match(rel_path):
+            return False
+        return keep is None or not keep.match(rel_path)
+
+
+class PathFilter:
+    # Исключение папок и файлов при обходе. Исключённая папка не открывается
+    # вовсе, поэтому её содержимое (node_modules, build и т.п.) не обходится.
+    # include - если задан, проверяются только подходящие к нему файлы
+
+    def __init__(self, exclude=(), include=(), use_gitignore=False, rule_sets=None):
+        self.include = compile_rules(list(include))
+        self.use_gitignore = use_gitignore
+        if rule_sets is None:
+            rules = RuleSet(exclude)
+            rule_sets = [] if rules.is_empty() else [rules]
+        self.rule_sets = rule_sets
+
+    def is_active(self):
+        return bool(self.rule_sets) or self.include is not None or self.use_gitignore
+
+    def enter(self, dir_path, rel_dir):
+        # Фильтр для содержимого папки: добавляются правила её .gitignore
+        if not self.use_gitignore:
+            return self
+        try:
+            with open(os.path.join(dir_path, GITIGNORE), encoding='utf-8', errors='replace') as f:
+                rules = RuleSet(f, rel_dir)
+        except OSError:
+            return self
+        if rules.is_empty():
+            return self
+        child = PathFilter(use_gitignore=True, rule_sets=self.rule_sets + [rules])
+        child.include = self.include
+        return child
+
+    def excludes_dir(self, rel_path):
+        return any(rules.excludes(rel_path, True) for rules in self.rule_sets)
+
+    def excludes_file(self, rel_path):
+        if self.include is not None and not self.include.match(rel_path):
+            return True
+        return any(rules.excludes(rel_path, False) for rules in self.rule_sets)
+
+    def excludes_path(self, rel_path):
+        # Проверка пути без обхода: исключён сам файл или одна из его папок
+        parts = rel_path.split('/')
+        for i in range(1, len(parts)):
+            if self.excludes_dir('/'.join(parts[:i])):
+                return True
+        return self.excludes_file(rel_path)
@@ -0,0 +1,227 @@
+import os
+import re
+import time
+import sqlite3
+from array import array
+
+from path_filter import glob_to_regex
+from storage import data_dir, root_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS paths_path ON paths (path);
+CREATE TABLE IF NOT EXISTS path_trigrams (
+    trigram TEXT PRIMARY KEY,
+    ids BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS name_trigrams (
+    trigram TEXT PRIMARY KEY,
+    ids BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+PATH_INDEX_VERSION = 3
+
+# Индекс путей старше этого перестраивается обходом (как updatedb у locate), сек.
+# Индекс, который поддерживает наблюдатель за папкой, по возрасту не устаревает
+MAX_AGE = 3600
+
+# Сколько id запрашивать одним SELECT ... IN (...). Если кандидатов больше
+# FULL_SCAN_IDS, быстрее прочитать таблицу путей целиком
+SELECT_BATCH = 900
+FULL_SCAN_IDS = 50000
+# Столько кандидатов проще проверить, чем пересекать дальше
+FEW_CANDIDATES = 1000
+
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def add_postings(postings, grams, file_id):
+    for gram in grams:
+        ids = postings.get(gram)
+        if ids is None:
+            ids = postings[gram] = array('I')
+        ids.append(file_id)
+
+
+class NamePattern:
+    # Запрос по имени файла: подстрока или шаблон (*, ?, [...]) без учёта
+    # регистра. Без '/' проверяется имя файла, с '/' - путь относительно
+    # папки поиска
+
+    def __init__(self, pattern):
+        self.pattern = pattern.strip()
+        self.by_path = '/' in self.pattern
+        if GLOB_CHARS.search(self.pattern):
+            self.regex = re.compile(glob_to_regex(self.pattern) + r'\Z', re.IGNORECASE)
+            # Буквальные куски шаблона - для выбора кандидатов по индексу
+            parts = re.split(r'\[[^\]]*\]|[*?]', self.pattern.lstrip('/'))
+        else:
+            self.regex = None
+            parts = [self.pattern.lstrip('/') if self.by_path else self.pattern]
+        self.parts = [part.lower().replace('\\', '') for part in parts if part]
+        self.literal = self.parts[0] if self.parts else ''
+
+    def matches(self, rel_path):
+        if self.regex is not None:
+            return self.regex.match(rel_path) is not None
+        text = rel_path if self.by_path else rel_path.rpartition('/')[2]
+        return self.literal in text.lower()
+
+    def trigrams(self):
+        grams = set()
+        for part in self.parts:
+            grams |= trigrams(part)
+        return grams
+
+
+class PathIndex:
+    # Триграммный индекс путей одной папки поиска, как у locate: для каждой
+    # тройки символов пути (в нижнем регистре) - отсортированный список id
+    # путей. Тройки имён файлов хранятся отдельно, чтобы запрос по имени не
+    # выбирал пути, где подстрока есть только в папках. Запрос пересекает
+    # списки своих троек и проверяет лишь оставшиеся пути, содержимое файлов
+    # не читается
+
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(data_dir("path_index"), root_key(root) + ".sqlite")
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != PATH_INDEX_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS paths; DROP TABLE IF EXISTS trigrams; DROP TABLE IF EXISTS path_trigrams; "
+                "DROP TABLE IF EXISTS name_trigrams; DROP TABLE IF EXISTS meta;"
+            )
+            self.conn.execute(f"PRAGMA user_version = {PATH_INDEX_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def built_at(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, max_age=MAX_AGE):
+        built_at = self.built_at()
+        return built_at is not None and time.time() - built_at < max_age
+
+    def rebuild(self, entries):
+        # entries - (путь относительно папки, stat) всех файлов папки.
+        # Списки троек собираются в памяти и записываются одной транзакцией.
+        # Время построения - начало обхода: изменения во время обхода
+        # наблюдатель вносит после него
+        built_at = time.time()
+        path_postings = {}
+        name_postings = {}
+        conn = self.conn
+        with conn:
+            conn.execute("DELETE FROM paths")
+            conn.execute("DELETE FROM path_trigrams")
+            conn.execute("DELETE FROM name_trigrams")
+            rows = []
+            for file_id, (rel_path, st) in enumerate(entries, 1):
+                rows.append((file_id, rel_path, st.st_size, st.st_mtime_ns))
+                lowered = rel_path.lower()
+                add_postings(path_postings, trigrams(lowered), file_id)
+                add_postings(name_postings, trigrams(lowered.rpartition('/')[2]), file_id)
+                if len(rows) >= 10000:
+                    conn.executemany("INSERT INTO paths VALUES (?, ?, ?, ?)", rows)
+                    rows = []
+            conn.executemany("INSERT INTO paths VALUES (?, ?, ?, ?)", rows)
+            for table, postings in (("path_trigrams", path_postings), ("name_trigrams", name_postings)):
+                conn.executemany(
+                    f"INSERT INTO {table} VALUES (?, ?)",
+                    ((gram, ids.tobytes()) for gram, ids in postings.items())
+                )
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('built_at', ?)", (built_at,))
+
+    def add(self, rel_path, st):
+        # Новый или изменённый файл от наблюдателя. Новый id больше всех
+        # прежних, поэтому списки троек остаются отсортированными
+        conn = self.conn
+        row = conn.execute("SELECT id FROM paths WHERE path = ?", (rel_path,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE paths SET size = ?, mtime_ns = ? WHERE id = ?", (st.st_size, st.st_mtime_ns, row[0]))
+            return
+        file_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM paths").fetchone()[0]
+        conn.execute("INSERT INTO paths VALUES (?, ?, ?, ?)", (file_id, rel_path, st.st_size, st.st_mtime_ns))
+        lowered = rel_path.lower()
+        for table, grams in (
+            ("path_trigrams", trigrams(lowered)),
+            ("name_trigrams", trigrams(lowered.rpartition('/')[2]))
+        ):
+            for gram in grams:
+                ids = array('I')
+                row = conn.execute(f"SELECT ids FROM {table} WHERE trigram = ?", (gram,)).fetchone()
+                if row is not None:
+                    ids.frombytes(row[0])
+                ids.append(file_id)
+                conn.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?)", (gram, ids.tobytes()))
+
+    def remove_tree(self, rel_path):
+        # Удалён файл или папка целиком. id удалённых путей остаются в списках
+        # троек: кандидаты без строки в paths просто не находятся
+        prefix = rel_path + '/'
+        self.conn.execute(
+            "DELETE FROM paths WHERE path = ? OR (path >= ? AND path < ?)",
+            (rel_path, prefix, prefix + "\U0010ffff")
+        )
+
+    def candidate_ids(self, grams, table):
+        # Пересечение списков троек, начиная с самых коротких. Когда кандидатов
+        # осталось мало, длинные списки частых троек не читаются - кандидаты
+        # всё равно проверяются по самому запросу. None - в запросе нет троек
+        if not grams:
+            return None
+        sizes = []
+        for gram in grams:
+            row = self.conn.execute(f"SELECT length(ids) FROM {table} WHERE trigram = ?", (gram,)).fetchone()
+            if row is None:
+                return []
+            sizes.append((row[0], gram))
+        sizes.sort()
+        candidates = None
+        for _, gram in sizes:
+            ids = array('I')
+            ids.frombytes(self.conn.execute(f"SELECT ids FROM {table} WHERE trigram = ?", (gram,)).fetchone()[0])
+            if candidates is None:
+                candidates = set(ids)
+            else:
+                candidates.intersection_update(ids)
+            if len(candidates) <= FEW_CANDIDATES:
+                break
+        return sorted(candidates)
+
+    def search(self, name_pattern):
+        # Пути относительно папки (через '/'), подходящие под запрос
+        table = "path_trigrams" if name_pattern.by_path else "name_trigrams"
+        ids = self.candidate_ids(name_pattern.trigrams(), table)
+        if ids is None:
+            rows = self.conn.execute("SELECT id, path FROM paths")
+        elif len(ids) > FULL_SCAN_IDS:
+            ids = set(ids)
+            rows = [row for row in self.conn.execute("SELECT id, path FROM paths") if row[0] in ids]
+        else:
+            rows = []
+            for i in range(0, len(ids), SELECT_BATCH):
+                batch = ids[i:i + SELECT_BATCH]
+                rows += self.conn.execute(
+                    f"SELECT id, path FROM paths WHERE id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+        return [rel_path for _, rel_path in rows if name_pattern.matches(rel_path)]
@@ -0,0 +1,520 @@
+import re
+import mmap
+import zlib
+import base64
+import binascii
+
+# Извлечение текста из PDF без сторонних библиотек. Текст отдаётся по страницам,
+# поэтому при досрочной остановке поиска остальные страницы не распаковываются
+
+WHITESPACE = b' \t\r\n\f\x00'
+TOKEN_RE = re.compile(rb'[^\s()<>\[\]{}/%\x00]+')
+NAME_RE = re.compile(rb'/[^\s()<>\[\]{}/%\x00]*')
+OBJECT_RE = re.compile(rb'(?<!\d)(\d+)\s+(\d+)\s+obj\b')
+ROOT_RE = re.compile(rb'/Root\s+(\d+)\s+(\d+)\s+R')
+ENCRYPT_RE = re.compile(rb'/Encrypt\s+\d+\s+\d+\s+R')
+STRING_ESCAPES = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+    ord('f'): b'\f', ord('('): b'(', ord(')'): b')', ord('\\'): b'\\',
+}
+
+# Смещение в TJ, начиная с которого считаем, что между фрагментами пробел
+TJ_SPACE_THRESHOLD = -250
+
+
+class Ref:
+    __slots__ = ("num",)
+
+    def __init__(self, num):
+        self.num = num
+
+
+class Name(str):
+    pass
+
+
+class Operator(bytes):
+    pass
+
+
+class Stream:
+    __slots__ = ("attrs", "start", "end")
+
+    def __init__(self, attrs, start, end):
+        self.attrs = attrs
+        self.start = start
+        self.end = end
+
+
+def read_literal(data, pos):
+    # Строка в круглых скобках: экранирование и вложенные скобки
+    out = bytearray()
+    depth = 1
+    length = len(data)
+    while pos < length:
+        ch = data[pos]
+        pos += 1
+        if ch == 0x5C:  # обратная косая черта
+            if pos >= length:
+                break
+            esc = data[pos]
+            pos += 1
+            if esc in STRING_ESCAPES:
+                out += STRING_ESCAPES[esc]
+            elif 0x30 <= esc <= 0x37:
+                digits = bytes([esc])
+                while len(digits) < 3 and pos < length and 0x30 <= data[pos] <= 0x37:
+                    digits += bytes([data[pos]])
+                    pos += 1
+                out.append(int(digits, 8) & 0xFF)
+            elif esc == 0x0D:
+                if pos < length and data[pos] == 0x0A:
+                    pos += 1
+            elif esc != 0x0A:
+                out.append(esc)
+        elif ch == 0x28:
+            depth += 1
+            out.append(ch)
+        elif ch == 0x29:
+            depth -= 1
+            if depth == 0:
+                break
+            out.append(ch)
+        else:
+            out.append(ch)
+    return bytes(out), pos
+
+
+def parse_number(token):
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return None
+
+
+def next_token(data, pos):
+    # Следующая лексема: (значение, позиция после неё); None в конце данных
+    length = len(data)
+    while pos < length:
+        ch = data[pos]
+        if ch in WHITESPACE:
+            pos += 1
+        elif ch == 0x25:  # комментарий
+            while pos < length and data[pos] not in b'\r\n':
+                pos += 1
+        else:
+            break
+    if pos >= length:
+        return None, pos
+
+    ch = data[pos]
+    if ch == 0x2F:
+        match = NAME_RE.match(data, pos)
+        return Name(match.group()[1:].decode('latin-1')), match.end()
+    if ch == 0x28:
+        return read_literal(data, pos + 1)
+    if ch == 0x3C:
+        if data[pos + 1:pos + 2] == b'<':
+            return Operator(b'<<'), pos + 2
+        end = data.find(b'>', pos)
+        if end == -1:
+            return None, length
+        hex_digits = re.sub(rb'[^0-9A-Fa-f]', b'', data[pos + 1:end])
+        if len(hex_digits) % 2:
+            hex_digits += b'0'
+        return binascii.unhexlify(hex_digits), end + 1
+    if ch == 0x3E:
+        if data[pos + 1:pos + 2] == b'>':
+            return Operator(b'>>'), pos + 2
+        return Operator(b'>'), pos + 1
+    if ch in b'[]{}':
+        return Operator(bytes([ch])), pos + 1
+
+    match = TOKEN_RE.match(data, pos)
+    if match is None:
+        return Operator(bytes([ch])), pos + 1
+    token = match.group()
+    number = parse_number(token)
+    if number is not None:
+        return number, match.end()
+    return Operator(token), match.end()
+
+
+def parse_value(data, pos):
+    # Разбор объекта PDF: словари, массивы, ссылки "N G R", числа, имена, строки
+    token, pos = next_token(data, pos)
+    if isinstance(token, Operator):
+        if token == b'<<':
+            items, pos = parse_sequence(data, pos, b'>>')
+            return dict(zip(items[::2], items[1::2])), pos
+        if token == b'[':
+            return parse_sequence(data, pos, b']')
+        if token == b'true':
+            return True, pos
+        if token == b'false':
+            return False, pos
+        if token == b'null':
+            return None, pos
+    return token, pos
+
+
+def parse_sequence(data, pos, closing):
+    items = []
+    while True:
+        start = pos
+        token, pos = next_token(data, pos)
+        if token is None or token == closing:
+            return items, pos
+        if isinstance(token, Operator) and token in (b'<<', b'['):
+            value, pos = parse_value(data, start)
+            items.append(value)
+        elif token == b'R' and len(items) >= 2 and type(items[-1]) is int and type(items[-2]) is int:
+            items[-2:] = [Ref(items[-2])]
+        elif isinstance(token, Operator) and token in (b'true', b'false', b'null'):
+            value, pos = parse_value(data, start)
+            items.append(value)
+        else:
+            items.append(token)
+
+
+def apply_png_predictor(data, columns):
+    # Предиктор PNG (в основном для потоков перекрёстных ссылок)
+    row_length = columns + 1
+    previous = bytearray(columns)
+    out = bytearray()
+    for offset in range(0, len(data) - row_length + 1, row_length):
+        kind = data[offset]
+        row = bytearray(data[offset + 1:offset + row_length])
+        for i in range(columns):
+            left = row[i - 1] if i else 0
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + previous[i]) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xFF
+            elif kind == 4:
+                up_left = previous[i - 1] if i else 0
+                p = left + previous[i] - up_left
+                pa, pb, pc = abs(p - left), abs(p - previous[i]), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else previous[i] if pb <= pc else up_left)) & 0xFF
+        out += row
+        previous = row
+    return bytes(out)
+
+
+class ToUnicodeMap:
+    # Таблица ToUnicode шрифта: коды символов -> текст
+
+    HEX_RE = re.compile(rb'<([0-9A-Fa-f\s]*)>')
+
+    def __init__(self, data):
+        self.mapping = {}
+        self.code_length = 1
+        spaces = re.search(rb'begincodespacerange(.*?)endcodespacerange', data, re.S)
+        if spaces:
+            codes = self.HEX_RE.findall(spaces.group(1))
+            if codes:
+                self.code_length = max(1, len(re.sub(rb'\s', b'', codes[0])) // 2)
+        for block in re.findall(rb'beginbfchar(.*?)endbfchar', data, re.S):
+            codes = self.HEX_RE.findall(block)
+            for src, dst in zip(codes[::2], codes[1::2]):
+                self.mapping[self.to_int(src)] = self.to_text(dst)
+        for block in re.findall(rb'beginbfrange(.*?)endbfrange', data, re.S):
+            for match in re.finditer(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])', block):
+                low, high = int(match.group(1), 16), int(match.group(2), 16)
+                target = match.group(3)
+                if target.startswith(b'['):
+                    for i, dst in enumerate(self.HEX_RE.findall(target)):
+                        self.mapping[low + i] = self.to_text(dst)
+                    continue
+                dst = bytearray(binascii.unhexlify(re.sub(rb'\s', b'', target[1:-1])))
+                for code in range(low, min(high, low + 0xFFFF) + 1):
+                    self.mapping[code] = bytes(dst).decode('utf-16-be', errors='ignore')
+                    if dst:
+                        dst[-1] = (dst[-1] + 1) & 0xFF
+
+    @staticmethod
+    def to_int(hex_digits):
+        return int(re.sub(rb'\s', b'', hex_digits) or b'0', 16)
+
+    @staticmethod
+    def to_text(hex_digits):
+        raw = binascii.unhexlify(re.sub(rb'\s', b'', hex_digits))
+        return raw.decode('utf-16-be', errors='ignore')
+
+    def decode(self, raw):
+        step = self.code_length
+        mapping = self.mapping
+        return ''.join(
+            mapping.get(int.from_bytes(raw[i:i + step], 'big'), '')
+            for i in range(0, len(raw), step)
+        )
+
+
+class PdfDocument:
+    def __init__(self, data):
+        self.data = data
+        self.offsets = {}
+        for match in OBJECT_RE.finditer(data):
+            # При дописанных обновлениях действует последнее определение объекта
+            self.offsets[int(match.group(1))] = match.end()
+        self.cache = {}
+        self.compressed = None
+        self.fonts = {}
+
+    def is_encrypted(self):
+        return ENCRYPT_RE.search(self.data, max(0, len(self.data) - 4096)) is not None
+
+    def resolve(self, value):
+        depth = 0
+        while isinstance(value, Ref) and depth < 32:
+            value = self.get(value.num)
+            depth += 1
+        return value
+
+    def get(self, num):
+        if num in self.cache:
+            return self.cache[num]
+        value = None
+        if num in self.offsets:
+            value = self.parse_object(self.offsets[num])
+        else:
+            value = self.get_compressed(num)
+        self.cache[num] = value
+        return value
+
+    def parse_object(self, pos):
+        data = self.data
+        value, pos = parse_value(data, pos)
+        if isinstance(value, dict):
+            token, after = next_token(data, pos)
+            if token == b'stream':
+                start = after
+                if data[start:start + 2] == b'\r\n':
+                    start += 2
+                elif data[start:start + 1] in (b'\n', b'\r'):
+                    start += 1
+                end = -1
+                length = value.get('Length')
+                if type(length) is int:
+                    tail = data[start + length:start + length + 20].lstrip(WHITESPACE)
+                    if tail.startswith(b'endstream'):
+                        end = start + length
+                if end == -1:
+                    end = data.find(b'endstream', start)
+                    if end == -1:
+                        end = len(data)
+                return Stream(value, start, end)
+        return value
+
+    def get_compressed(self, num):
+        # Объекты внутри потоков объектов (PDF 1.5+)
+        if self.compressed is None:
+            self.compressed = {}
+            for stream_num in list(self.offsets):
+                stream = self.get(stream_num)
+                if not isinstance(stream, Stream) or stream.attrs.get('Type') != 'ObjStm':
+                    continue
+                content = self.decode_stream(stream)
+                if content is None:
+                    continue
+                first = stream.attrs.get('First', 0)
+                header = content[:first].split()
+                for i in range(0, len(header) - 1, 2):
+                    self.compressed[int(header[i])] = (content, first + int(header[i + 1]))
+        entry = self.compressed.get(num)
+        if entry is None:
+            return None
+        content, pos = entry
+        return parse_value(content, pos)[0]
+
+    def decode_stream(self, stream):
+        data = bytes(self.data[stream.start:stream.end])
+        filters = self.resolve(stream.attrs.get('Filter'))
+        params = self.resolve(stream.attrs.get('DecodeParms'))
+        if filters is None:
+            return data
+        if not isinstance(filters, list):
+            filters = [filters]
+            params = [params]
+        elif not isinstance(params, list):
+            params = [params] * len(filters)
+        for name, param in zip(filters, params):
+            name = self.resolve(name)
+            param = self.resolve(param) or {}
+            if name in ('FlateDecode', 'Fl'):
+                try:
+                    data = zlib.decompressobj().decompress(data)
+                except zlib.error:
+                    return None
+                predictor = param.get('Predictor', 1) if isinstance(param, dict) else 1
+                if predictor >= 10:
+                    data = apply_png_predictor(data, param.get('Columns', 1))
+            elif name in ('ASCIIHexDecode', 'AHx'):
+                digits = re.sub(rb'[^0-9A-Fa-f]', b'', data.split(b'>')[0])
+                data = binascii.unhexlify(digits + b'0' * (len(digits) % 2))
+            elif name in ('ASCII85Decode', 'A85'):
+                body = data.strip()
+                if body.startswith(b'<~'):
+                    body = body[2:]
+                try:
+                    data = base64.a85decode(body.split(b'~>')[0])
+                except ValueError:
+                    return None
+            else:
+                # Изображения и редкие фильтры текста не содержат
+                return None
+        return data
+
+    def iter_pages(self):
+        # Страницы в порядке дерева страниц с унаследованными ресурсами
+        root_match = None
+        for root_match in ROOT_RE.finditer(self.data, max(0, len(self.data) - 65536)):
+            pass
+        catalog = self.resolve(Ref(int(root_match.group(1)))) if root_match else None
+        pages = self.resolve(catalog.get('Pages')) if isinstance(catalog, dict) else None
+        if not isinstance(pages, dict):
+            # Дерево страниц не найдено - берём объекты страниц по порядку номеров
+            for num in sorted(self.offsets):
+                page = self.get(num)
+                if isinstance(page, dict) and page.get('Type') == 'Page':
+                    yield page, self.resolve(page.get('Resources'))
+            return
+
+        stack = [(pages, None)]
+        visited = set()
+        while stack:
+            node, inherited = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            resources = self.resolve(node.get('Resources')) or inherited
+            kids = self.resolve(node.get('Kids'))
+            if isinstance(kids, list):
+                for kid in reversed(kids):
+                    kid = self.resolve(kid)
+                    if isinstance(kid, dict):
+                        stack.append((kid, resources))
+            else:
+                yield node, resources
+
+    def font_maps(self, resources):
+        fonts = self.resolve(resources.get('Font')) if isinstance(resources, dict) else None
+        maps = {}
+        if not isinstance(fonts, dict):
+            return maps
+        for name, ref in fonts.items():
+            key = ref.num if isinstance(ref, Ref) else id(ref)
+            if key not in self.fonts:
+                font = self.resolve(ref)
+                cmap = None
+                if isinstance(font, dict):
+                    to_unicode = self.resolve(font.get('ToUnicode'))
+                    if isinstance(to_unicode, Stream):
+                        content = self.decode_stream(to_unicode)
+                        if content:
+                            cmap = ToUnicodeMap(content)
+                self.fonts[key] = cmap
+            maps[name] = self.fonts[key]
+        return maps
+
+    def page_text(self, page, resources):
+        contents = self.resolve(page.get('Contents'))
+        if not isinstance(contents, list):
+            contents = [contents]
+        parts = []
+        for content in contents:
+            stream = self.resolve(content)
+            if isinstance(stream, Stream):
+                decoded = self.decode_stream(stream)
+                if decoded:
+                    parts.append(decoded)
+        return content_text(b'\n'.join(parts), self.font_maps(resources))
+
+
+def decode_string(raw, cmap):
+    if cmap is not None:
+        return cmap.decode(raw)
+    return raw.decode('cp1252', errors='ignore')
+
+
+def content_text(data, fonts):
+    # Текст из операторов вывода текста потока содержимого страницы
+    out = []
+    operands = []
+    cmap = None
+    last_y = None
+    pos = 0
+    length = len(data)
+    while pos < length:
+        start = pos
+        token, pos = next_token(data, pos)
+        if token is None:
+            break
+        if not isinstance(token, Operator):
+            operands.append(token)
+            continue
+        if token == b'[':
+            value, pos = parse_sequence(data, pos, b']')
+            operands.append(value)
+            continue
+        if token == b'<<':
+            _, pos = parse_value(data, start)
+            continue
+
+        if token == b'Tf' and len(operands) >= 2:
+            cmap = fonts.get(operands[-2])
+        elif token == b'Tj' and operands and isinstance(operands[-1], bytes):
+            out.append(decode_string(operands[-1], cmap))
+        elif token in (b"'", b'"') and operands and isinstance(operands[-1], bytes):
+            out.append('\n')
+            out.append(decode_string(operands[-1], cmap))
+        elif token == b'TJ' and operands and isinstance(operands[-1], list):
+            for item in operands[-1]:
+                if isinstance(item, bytes):
+                    out.append(decode_string(item, cmap))
+                elif isinstance(item, (int, float)) and item < TJ_SPACE_THRESHOLD:
+                    out.append(' ')
+        elif token in (b'Td', b'TD') and len(operands) >= 2:
+            if operands[-1] != 0:
+                out.append('\n')
+        elif token == b'Tm' and len(operands) >= 6:
+            if last_y is not None and operands[-1] != last_y:
+                out.append('\n')
+            last_y = operands[-1]
+        elif token in (b'T*', b'ET'):
+            out.append('\n')
+        elif token == b'ID':
+            # Встроенное изображение: двоичные данные до EI
+            end = re.compile(rb'\sEI(?=[\s]|$)').search(data, pos)
+            pos = end.end() if end else length
+        operands = []
+    return ''.join(out)
+
+
+def extract_pdf(f):
+    # Текст PDF постранично
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        data = f.read()
+    try:
+        document = PdfDocument(data)
+        if document.is_encrypted():
+            return
+        for page, resources in document.iter_pages():
+            try:
+                text = document.page_text(page, resources)
+            except Exception:
+                continue
+            if text:
+                yield text
+                yield '\n'
+    finally:
+        document = None
+        if isinstance(data, mmap.mmap):
+            data.close()
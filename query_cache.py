@@ -0,0 +1,168 @@
+import os
+import time
+import sqlite3
+
+from storage import data_dir, query_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    listed INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    found INTEGER,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+QUERY_CACHE_VERSION = 2
+
+# Сколько запросов хранить: файлы давно не повторявшихся запросов удаляются
+MAX_QUERIES = 32
+
+# Изменение в пределах одного такта времени ФС не меняет mtime, поэтому
+# папки и файлы, изменённые совсем недавно, в кэше считаются изменёнными
+RACY_SECONDS = 2
+
+# Сколько записей делать в одной транзакции
+COMMIT_EVERY = 1000
+
+
+def dir_key(path):
+    # Папки хранятся по абсолютному пути: './a/b' и 'a/b' - одна папка
+    return os.path.abspath(path)
+
+
+def subtree_pattern(dir_path):
+    # Шаблон LIKE для всего, что лежит внутри папки. '%', '_' и '\' в имени
+    # экранируются, чтобы совпадали только буквально
+    escaped = (dir_path + os.sep).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+class QueryCache:
+    # Результаты одного запроса (путь, расширения, ключевые слова, размер,
+    # режимы) для повторных поисков. Для папки хранится mtime и список
+    # подпапок и подходящих файлов: если mtime не изменился, папка не
+    # читается заново. Для файла - размер, mtime и ответ: неизменённый файл
+    # не читается, ответ берётся из кэша
+
+    def __init__(self, params, path=None):
+        cache_dir = data_dir("query_cache")
+        self.path = path or os.path.join(cache_dir, query_key(params) + ".sqlite")
+        self.evict(cache_dir)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != QUERY_CACHE_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS dirs; DROP TABLE IF EXISTS files;")
+            self.conn.execute(f"PRAGMA user_version = {QUERY_CACHE_VERSION}")
+        self.conn.executescript(SCHEMA)
+        # Пути различаются регистром, а LIKE по умолчанию его не учитывает
+        self.conn.execute("PRAGMA case_sensitive_like = ON")
+        self.pending_writes = 0
+        # Время начала поиска: всё, что изменено позже (или почти тогда же), не кэшируется
+        self.racy_after = (time.time() - RACY_SECONDS) * 1e9
+
+    def evict(self, cache_dir):
+        try:
+            names = [name for name in os.listdir(cache_dir) if name.endswith(".sqlite")]
+        except OSError:
+            return
+        paths = [os.path.join(cache_dir, name) for name in names]
+        if os.path.basename(self.path) in names:
+            paths.remove(self.path)
+            # Текущий запрос - самый свежий
+            os.utime(self.path)
+        if len(paths) < MAX_QUERIES:
+            return
+        paths.sort(key=lambda p: os.stat(p).st_mtime)
+        for stale in paths[:len(paths) - MAX_QUERIES + 1]:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(stale + suffix)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def stable_mtime(self, mtime_ns):
+        # -1 никогда не совпадёт с настоящим mtime
+        return -1 if mtime_ns >= self.racy_after else mtime_ns
+
+    def wrote(self):
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def listing(self, dir_path, mtime_ns):
+        # (имена подпапок, имена подходящих файлов) или None, если папку надо прочитать
+        dir_path = dir_key(dir_path)
+        row = self.conn.execute("SELECT mtime_ns, listed FROM dirs WHERE path = ?", (dir_path,)).fetchone()
+        if row is None or not row[1] or row[0] != mtime_ns:
+            return None
+        subdirs = [
+            os.path.basename(path) for (path,) in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (dir_path,))
+        ]
+        names = [name for (name,) in self.conn.execute("SELECT name FROM files WHERE dir = ?", (dir_path,))]
+        return subdirs, names
+
+    def record_listing(self, dir_path, mtime_ns, subdirs, names):
+        # Содержимое прочитанной папки. Исчезнувшие подпапки и файлы удаляются,
+        # ответы по оставшимся файлам сохраняются
+        dir_path = dir_key(dir_path)
+        conn = self.conn
+        conn.execute(
+            "INSERT INTO dirs (path, parent, mtime_ns, listed) VALUES (?, NULL, ?, 1) "
+            "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, listed = 1",
+            (dir_path, self.stable_mtime(mtime_ns))
+        )
+        known = {path for (path,) in conn.execute("SELECT path FROM dirs WHERE parent = ?", (dir_path,))}
+        current = {dir_key(path) for path in subdirs}
+        for path in known - current:
+            # Исчезнувшая подпапка удаляется вместе со всем, что было внутри
+            pattern = subtree_pattern(path)
+            conn.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (path, pattern))
+            conn.execute("DELETE FROM files WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (path, pattern))
+        conn.executemany(
+            "INSERT INTO dirs (path, parent, mtime_ns, listed) VALUES (?, ?, -1, 0)",
+            ((path, dir_path) for path in current - known)
+        )
+        known = {name for (name,) in conn.execute("SELECT name FROM files WHERE dir = ?", (dir_path,))}
+        current = set(names)
+        conn.executemany("DELETE FROM files WHERE dir = ? AND name = ?", ((dir_path, name) for name in known - current))
+        conn.executemany(
+            "INSERT INTO files (dir, name, size, mtime_ns, found) VALUES (?, ?, -1, -1, NULL)",
+            ((dir_path, name) for name in current - known)
+        )
+        self.wrote()
+
+    def verdicts(self, dir_path):
+        # {имя: (размер, mtime, найден)} по файлам папки с известным ответом
+        dir_path = dir_key(dir_path)
+        return {
+            name: (size, mtime_ns, bool(found))
+            for name, size, mtime_ns, found in self.conn.execute(
+                "SELECT name, size, mtime_ns, found FROM files WHERE dir = ? AND found IS NOT NULL", (dir_path,)
+            )
+        }
+
+    def record(self, file_path, st, found):
+        self.conn.execute(
+            "INSERT INTO files (dir, name, size, mtime_ns, found) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(dir, name) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+            "found = excluded.found",
+            (dir_key(os.path.dirname(file_path)), os.path.basename(file_path), st.st_size,
+             self.stable_mtime(st.st_mtime_ns), int(found))
+        )
+        self.wrote()
@@ -0,0 +1,58 @@
+import heapq
+import math
+from itertools import count
+
+# Параметры BM25: насыщение частоты слова и нормировка по длине текста
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class TopResults:
+    # Лучшие top_k найденных файлов по оценке BM25. В памяти - только куча
+    # из top_k записей. Статистика коллекции (число файлов, средняя длина,
+    # в скольких файлах есть каждое слово) копится по ходу поиска, поэтому
+    # оценки в куче предварительные; в конце оставшиеся записи оцениваются
+    # заново по итоговой статистике
+
+    def __init__(self, top_k, keyword_count):
+        self.top_k = top_k
+        self.heap = []
+        self.sequence = count()
+        self.documents = 0
+        self.total_length = 0
+        self.document_frequency = [0] * keyword_count
+
+    def add_document(self, counts, length):
+        # Учитываем каждый прочитанный файл, в том числе без совпадений
+        self.documents += 1
+        self.total_length += length
+        for i, tf in enumerate(counts):
+            if tf:
+                self.document_frequency[i] += 1
+
+    def score(self, counts, length):
+        documents = max(self.documents, 1)
+        average_length = self.total_length / documents or 1
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+        score = 0.0
+        for tf, df in zip(counts, self.document_frequency):
+            if tf:
+                idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return score
+
+    def offer(self, match, counts, length):
+        entry = (self.score(counts, length), next(self.sequence), match, counts, length)
+        if len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, entry)
+        elif entry[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def ranked(self):
+        # Итоговый список по убыванию оценки
+        results = []
+        for _, sequence, match, counts, length in self.heap:
+            match["score"] = round(self.score(counts, length), 4)
+            results.append((match["score"], -sequence, match))
+        results.sort(reverse=True, key=lambda item: item[:2])
+        return [match for _, _, match in results]
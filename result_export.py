@@ -0,0 +1,149 @@
+import os
+import csv
+import sys
+import json
+import struct
+from array import array
+
+# Форматы потоковой выгрузки: csv, jsonl (JSON по строке на файл) и bin -
+# компактный столбцовый формат (блоки по BLOCK_ROWS строк)
+EXPORT_FORMATS = ("csv", "jsonl", "bin")
+
+BINARY_MAGIC = b"XFFRES1\n"
+BLOCK_HEADER = struct.Struct("<II")
+# Строк в одном блоке двоичного формата: столько держится в памяти
+BLOCK_ROWS = 4096
+
+# Числовые столбцы двоичного формата и их типы array
+BINARY_COLUMNS = {"size": 'q', "mtime": 'd', "score": 'd', "group": 'q'}
+
+
+def export_format_for(path, export_format=""):
+    # Формат задаётся явно или по расширению файла
+    if not export_format:
+        export_format = os.path.splitext(path)[1].lower().lstrip('.')
+        if export_format == "json":
+            export_format = "jsonl"
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {export_format or path} (csv, jsonl, bin)")
+    return export_format
+
+
+def export_record(match, columns):
+    # Исходные значения без форматирования
+    record = {
+        "path": match["file_path"],
+        "filename": match["filename"],
+        "size": match["size_bytes"],
+        "mtime": match["mtime"]
+    }
+    for column in columns[4:]:
+        record[column] = match.get(column)
+    return record
+
+
+class CsvExport:
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self.writer.writerow(columns)
+
+    def write(self, match):
+        record = export_record(match, self.columns)
+        self.writer.writerow([record[column] for column in self.columns])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesExport:
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, match):
+        self.file.write(json.dumps(export_record(match, self.columns), ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryExport:
+    # Заголовок: BINARY_MAGIC и строка JSON со списком столбцов. Затем блоки:
+    # число строк и длина путей (BLOCK_HEADER), числовые столбцы подряд
+    # (little-endian), длины путей (uint32) и сами пути в UTF-8. Имя файла
+    # не хранится - оно есть в пути
+    def __init__(self, path, columns):
+        self.columns = [column for column in columns if column in BINARY_COLUMNS]
+        self.file = open(path, 'wb')
+        self.file.write(BINARY_MAGIC)
+        self.file.write(json.dumps({"columns": ["path"] + self.columns}).encode('utf-8') + b"\n")
+        self.new_block()
+
+    def new_block(self):
+        self.values = {column: array(BINARY_COLUMNS[column]) for column in self.columns}
+        self.lengths = array('I')
+        self.paths = []
+
+    def write(self, match):
+        record = export_record(match, ["path", "filename", "size", "mtime"] + self.columns[2:])
+        for column in self.columns:
+            value = record[column]
+            self.values[column].append(-1 if value is None else value)
+        path = record["path"].encode('utf-8', 'surrogateescape')
+        self.lengths.append(len(path))
+        self.paths.append(path)
+        if len(self.paths) >= BLOCK_ROWS:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self.paths:
+            return
+        paths = b"".join(self.paths)
+        self.file.write(BLOCK_HEADER.pack(len(self.paths), len(paths)))
+        for values in list(self.values.values()) + [self.lengths]:
+            if sys.byteorder == 'big':
+                values.byteswap()
+            self.file.write(values.tobytes())
+        self.file.write(paths)
+        self.new_block()
+
+    def close(self):
+        self.flush_block()
+        self.file.close()
+
+
+def read_binary(path):
+    # Записи двоичного файла выгрузки по одной, как словари
+    with open(path, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"Не файл выгрузки: {path}")
+        columns = json.loads(f.readline())["columns"][1:]
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            rows, paths_size = BLOCK_HEADER.unpack(header)
+            block = {}
+            for column in columns + ["length"]:
+                values = array(BINARY_COLUMNS.get(column, 'I'))
+                values.frombytes(f.read(values.itemsize * rows))
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                block[column] = values
+            paths = f.read(paths_size)
+            offset = 0
+            for row in range(rows):
+                end = offset + block["length"][row]
+                record = {"path": paths[offset:end].decode('utf-8', 'surrogateescape')}
+                offset = end
+                for column in columns:
+                    record[column] = block[column][row]
+                yield record
+
+
+def open_export(path, export_format, columns):
+    # columns - path, filename, size, mtime и, если есть, score и group
+    export_class = {"csv": CsvExport, "jsonl": JsonLinesExport, "bin": BinaryExport}[export_format]
+    return export_class(path, columns)
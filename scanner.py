@@ -0,0 +1,366 @@
+import codecs
+import mmap
+import re
+from contextlib import contextmanager
+
+from matcher import create_matcher
+from byte_search import ByteMatcher, SNIFF_SIZE, detect_encodings
+from disk_io import advise_before_read, advise_after_read
+from extractors import get_extractor
+from text_cache import MAX_ENTRY_CHARS
+from stage_timings import StageTimings, clock
+
+# Размер окна чтения: память на файл ограничена им независимо от размера файла
+CHUNK_SIZE = 1024 * 1024
+
+# Термины индекса: непрерывные последовательности буквенно-цифровых символов
+TERM_RE = re.compile(r'\w+')
+# Более длинные термины (base64, хэши) не индексируются
+MAX_TERM_LENGTH = 64
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    # Файл читается окнами через mmap, без копирования целиком
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Ошибка mmap (пустой файл, особая ФС) - читаем обычным способом
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    with mm:
+        for offset in range(0, len(mm), chunk_size):
+            yield mm[offset:offset + chunk_size]
+
+
+class FileScanner:
+    # Проверка содержимого одного файла. Не зависит от Qt, поэтому может
+    # выполняться как в пуле потоков, так и в пуле процессов
+
+    def __init__(self, keywords, match_type, skip_binary, text_cache=None, pattern_mode="text",
+                 encodings=(), cache_hints=False):
+        self.keywords = keywords
+        self.match_type = match_type
+        self.pattern_mode = pattern_mode
+        self.skip_binary = skip_binary
+        # Кэш текста, извлечённого из документов
+        self.text_cache = text_cache
+        # Автомат и регулярные выражения строятся один раз на весь поиск
+        self.matcher = create_matcher(keywords, match_type, pattern_mode)
+        # Кодировки текстовых файлов (пусто - только UTF-8). В режиме подстроки
+        # файлы не декодируются: байты сравниваются с закодированными словами.
+        # Целые слова и выражения проверяются по тексту, декодированному
+        # первой подходящей кодировкой
+        self.encodings = list(encodings)
+        self.byte_matcher = None
+        if self.encodings and keywords and pattern_mode == "text":
+            self.byte_matcher = ByteMatcher(keywords, match_type, self.encodings)
+        # Подсказки ядру (posix_fadvise): упреждающее чтение перед чтением файла
+        # и освобождение его страниц после, чтобы поиск не вытеснял кэш ОС
+        self.cache_hints = cache_hints
+
+    @contextmanager
+    def open_file(self, file_path, extractor):
+        with open(file_path, 'rb') as f:
+            if not self.cache_hints:
+                yield f
+                return
+            # Документы читаются вразброс (архив zip), поэтому без SEQUENTIAL
+            advise_before_read(f, sequential=extractor is None)
+            try:
+                yield f
+            finally:
+                advise_after_read(f)
+
+    def matches(self, text):
+        return self.matcher.matches(text)
+
+    def iter_text(self, f, extractor, file_path, st, timings, encoding='utf-8'):
+        # Текст файла порциями в нижнем регистре
+        if extractor is not None:
+            if self.text_cache is not None:
+                texts = self.iter_cached_text(f, extractor, file_path, st)
+            else:
+                texts = (text.lower() for text in extractor(f))
+            start = clock()
+            for text in texts:
+                timings.add("extract", clock() - start)
+                yield text
+                start = clock()
+            return
+
+        # Окна декодируются по отдельности, символы на границе окон
+        # собирает инкрементальный декодер
+        decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+        start = clock()
+        for chunk in read_chunks(f):
+            now = clock()
+            timings.add("read", now - start)
+            text = decoder.decode(chunk).lower()
+            timings.add("decode", clock() - now)
+            yield text
+            start = clock()
+
+    def iter_cached_text(self, f, extractor, file_path, st):
+        # Текст документа из кэша. Если в кэше только начало текста (прошлый
+        # поиск остановился досрочно) и его не хватило, документ извлекается
+        # заново, уже проверенное начало пропускается, а запись дополняется
+        cache = self.text_cache
+        key = cache.key(file_path, st)
+        cached, complete = cache.get(key)
+        done = 0
+        if cached is not None:
+            yield cached
+            if complete:
+                return
+            done = len(cached)
+
+        parts = []
+        total = 0
+        complete = False
+        try:
+            for text in extractor(f):
+                text = text.lower()
+                start = total
+                total += len(text)
+                if parts is not None:
+                    parts.append(text)
+                    if total > MAX_ENTRY_CHARS:
+                        parts = None
+                if total > done:
+                    yield text[max(0, done - start):]
+            complete = True
+        finally:
+            if parts is not None and total > done:
+                cache.put(key, ''.join(parts), complete)
+
+    def is_binary(self, f):
+        # Бинарный файл - есть нулевой байт в первом килобайте
+        binary = b'\x00' in f.read(1024)
+        # Возвращаем указатель в начало файла
+        f.seek(0)
+        return binary
+
+    def sniff(self, f, timings):
+        # Кодировки, в которых проверять текстовый файл; пустой список - файл
+        # бинарный. Без заданных кодировок - проверка на нулевой байт
+        start = clock()
+        try:
+            if not self.encodings:
+                return [] if self.is_binary(f) else ['utf-8']
+            head = f.read(SNIFF_SIZE)
+            f.seek(0)
+            return detect_encodings(head, self.encodings)
+        finally:
+            timings.add("sniff", clock() - start)
+
+    def file_encodings(self, f, extractor, timings):
+        # None - файл пропускается как бинарный
+        if extractor is not None or not (self.skip_binary or self.encodings):
+            return ['utf-8']
+        encodings = self.sniff(f, timings)
+        if encodings:
+            return encodings
+        if self.skip_binary:
+            return None
+        # Бинарный файл без пропуска проверяется во всех кодировках
+        return self.encodings or ['utf-8']
+
+    def scan(self, file_path, st, timings=None):
+        # Документы (DOCX, XLSX, PPTX) - архивы: их текст извлекается,
+        # и проверка на бинарность к ним не применяется
+        if timings is None:
+            timings = StageTimings()
+        extractor = get_extractor(file_path)
+        start = clock()
+        with self.open_file(file_path, extractor) as f:
+            timings.add("open", clock() - start)
+            # Пропускаем бинарные файлы
+            try:
+                encodings = self.file_encodings(f, extractor, timings)
+            except OSError:
+                return False
+            if encodings is None:
+                return False
+
+            # Без ключевых слов подходит любой файл, читать его не нужно
+            if not self.keywords:
+                return True
+
+            if self.byte_matcher is not None and extractor is None:
+                # Кодировки, где регистр по байтам не привести, - декодированием
+                decoded = [name for name in encodings if name in self.byte_matcher.decoded]
+                for i, encoding in enumerate(decoded):
+                    if i:
+                        f.seek(0)
+                    if self.scan_text(f, extractor, file_path, st, timings, encoding):
+                        return True
+                encodings = [name for name in encodings if name not in self.byte_matcher.decoded]
+                if not encodings:
+                    return False
+                if decoded:
+                    f.seek(0)
+                return self.scan_bytes(f, encodings, timings)
+
+            # Если кодировка не определена однозначно (cp1251 или koi8-r),
+            # текст декодируется каждой по очереди до первого совпадения
+            for i, encoding in enumerate(encodings):
+                if i:
+                    f.seek(0)
+                if self.scan_text(f, extractor, file_path, st, timings, encoding):
+                    return True
+            return False
+
+    def scan_text(self, f, extractor, file_path, st, timings, encoding='utf-8'):
+        found, state = 0, 0
+        texts = self.iter_text(f, extractor, file_path, st, timings, encoding)
+        try:
+            for text in texts:
+                start = clock()
+                found, state = self.matcher.feed(text, found, state)
+                timings.add("match", clock() - start)
+                # Прекращаем чтение, как только ответ известен
+                if self.matcher.is_decided(found):
+                    break
+            else:
+                found = self.matcher.finish(found, state)
+        finally:
+            texts.close()
+        return self.matcher.is_match(found)
+
+    def scan_bytes(self, f, encodings, timings):
+        # Поиск по байтам файла без декодирования: образцы - ключевые слова,
+        # закодированные в кодировках файла
+        matcher = self.byte_matcher
+        plan = matcher.plan(encodings)
+        if not plan[0]:
+            return matcher.is_match(0)
+        found, state = 0, b''
+        chunks = read_chunks(f)
+        try:
+            start = clock()
+            for chunk in chunks:
+                now = clock()
+                timings.add("read", now - start)
+                found, state = matcher.feed(chunk, plan, found, state)
+                timings.add("match", clock() - now)
+                if matcher.is_decided(found):
+                    break
+                start = clock()
+        finally:
+            chunks.close()
+        return matcher.is_match(found)
+
+    def rank(self, file_path, st, timings=None):
+        # Полное чтение файла с подсчётом вхождений для ранжирования.
+        # Возвращает (совпадение, вхождения каждого слова, длина текста)
+        if timings is None:
+            timings = StageTimings()
+        extractor = get_extractor(file_path)
+        counts = [0] * len(self.matcher.keywords)
+        start = clock()
+        with self.open_file(file_path, extractor) as f:
+            timings.add("open", clock() - start)
+            encodings = self.file_encodings(f, extractor, timings)
+            if encodings is None:
+                return False, counts, 0
+
+            # Как и в scan, кодировки пробуются по очереди до первого совпадения
+            for i, encoding in enumerate(encodings):
+                if i:
+                    f.seek(0)
+                counts, length = self.count_text(f, extractor, file_path, st, timings, encoding)
+                found = 0
+                for j, tf in enumerate(counts):
+                    if tf:
+                        found |= 1 << j
+                if self.matcher.is_match(found):
+                    break
+        return self.matcher.is_match(found), counts, length
+
+    def count_text(self, f, extractor, file_path, st, timings, encoding='utf-8'):
+        counts = [0] * len(self.matcher.keywords)
+        state = ''
+        length = 0
+        for text in self.iter_text(f, extractor, file_path, st, timings, encoding):
+            start = clock()
+            counts, state = self.matcher.count(text, counts, state)
+            length += len(text)
+            timings.add("match", clock() - start)
+        return self.matcher.count_finish(counts, state), length
+
+    def index(self, file_path, st, timings=None):
+        # Полное чтение файла со сбором терминов для индекса.
+        # Возвращает (совпадение, бинарный, термины полны, термины)
+        if timings is None:
+            timings = StageTimings()
+        extractor = get_extractor(file_path)
+        start = clock()
+        with self.open_file(file_path, extractor) as f:
+            now = clock()
+            timings.add("open", now - start)
+            binary = extractor is None and self.is_binary(f)
+            if extractor is None:
+                timings.add("sniff", clock() - now)
+            if binary and self.skip_binary:
+                # Содержимое не индексируется - при другом режиме файл будет прочитан
+                return False, True, False, set()
+
+            found, state = 0, 0
+            terms = set()
+            exact = True
+            tail = ''
+            for text in self.iter_text(f, extractor, file_path, st, timings):
+                if not text:
+                    continue
+                start = clock()
+                found, state = self.matcher.feed(text, found, state)
+                now = clock()
+                timings.add("match", now - start)
+
+                # Незаконченное слово в конце порции переносим в следующую
+                words = TERM_RE.findall(tail + text)
+                tail = words.pop() if words and TERM_RE.match(text[-1]) else ''
+                if len(tail) > MAX_TERM_LENGTH:
+                    exact = False
+                    tail = ''
+                for word in words:
+                    if len(word) > MAX_TERM_LENGTH:
+                        exact = False
+                    else:
+                        terms.add(word)
+                timings.add("terms", clock() - now)
+            if tail:
+                terms.add(tail)
+            found = self.matcher.finish(found, state)
+            return self.matcher.is_match(found), binary, exact, terms
+
+
+# Сканер процесса-обработчика, задаётся один раз при старте пула
+_process_scanner = None
+
+
+def init_process_scanner(scanner):
+    global _process_scanner
+    _process_scanner = scanner
+
+
+def run_timed(func, file_path, st):
+    # Результат задачи вместе со временем её этапов
+    timings = StageTimings()
+    return func(file_path, st, timings), timings
+
+
+def scan_in_process(file_path, st):
+    return run_timed(_process_scanner.scan, file_path, st)
+
+
+def index_in_process(file_path, st):
+    return run_timed(_process_scanner.index, file_path, st)
+
+
+def rank_in_process(file_path, st):
+    return run_timed(_process_scanner.rank, file_path, st)
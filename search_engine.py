@@ -0,0 +1,872 @@
+import os
+import stat
+import time
+import pstats
+import cProfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from matcher import split_keywords
+from byte_search import normalize_encodings
+from checkpoint import SearchJournal, CHECKPOINT_INTERVAL
+from query_cache import QueryCache
+from result_export import export_format_for, open_export
+from disk_io import iter_ordered
+from duplicates import edge_digest, full_digest, edges_cover_file, split_groups
+from path_filter import PathFilter, split_patterns
+from path_index import PathIndex, NamePattern
+from ranking import TopResults
+from scanner import (
+    FileScanner, init_process_scanner, scan_in_process, index_in_process, rank_in_process, run_timed
+)
+from stage_timings import StageTimings, clock
+from search_index import SearchIndex
+from text_cache import TextCache
+
+# Сводка о ходе поиска отправляется не чаще, чем раз в PROGRESS_INTERVAL сек
+PROGRESS_INTERVAL = 0.1
+# Число функций в отчёте профилировщика
+PROFILE_LINES = 60
+
+
+def format_size(size):
+    # Конвертируем размер в читаемый формат
+    for unit in ['Б', 'КБ', 'МБ', 'ГБ']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ТБ"
+
+
+def format_modified(mtime):
+    return datetime.fromtimestamp(mtime).strftime("%d.%m.%Y %H:%M")
+
+
+class SearchEngine:
+    # Поиск файлов по содержимому без зависимости от Qt. Используется окном
+    # (через FileSearchWorker) и консольной версией (cli.py). О ходе поиска
+    # и найденных файлах сообщает через on_progress и on_match
+
+    def __init__(self, search_path, extensions, keywords, max_size_mb, skip_binary, match_type,
+                 workers=None, pool_type="thread", max_in_flight_mb=256, use_index=False,
+                 index_watcher=None, text_cache_mb=0, keep_results=True, profile_path=None,
+                 pattern_mode="text", exclude="", include="", use_gitignore=False, top_k=0,
+                 encodings="", duplicates=False, name_pattern="", io_order="walk", cache_hints=False,
+                 checkpoint=False, resume=False, query_cache=False, export_path="", export_format=""):
+        self.search_path = search_path
+        self.extensions = self.normalize_extensions(extensions)
+        # text - подстрока, word - целое слово, regex - регулярное выражение
+        self.pattern_mode = pattern_mode
+        self.keywords = split_keywords(keywords, pattern_mode)
+        self.results = []
+        self.is_running = True
+        self.file_count = 0
+        self.processed_files = 0
+        self.matches_found = 0
+        self.processed_bytes = 0
+        self.current_dir = search_path
+        self.last_progress = 0.0
+        self.candidates_found = 0
+        self.dirs_found = 0
+        self.dirs_scanned = 0
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.skip_binary = skip_binary
+        self.match_type = match_type
+        # Исключаемые папки и файлы (шаблоны через запятую, как в .gitignore)
+        self.path_filter = PathFilter(split_patterns(exclude), split_patterns(include), use_gitignore)
+        # Кэш текста документов (0 - отключён)
+        self.text_cache = TextCache(text_cache_mb * 1024 * 1024) if text_cache_mb else None
+        # Кодировки текстовых файлов через запятую (пусто - только UTF-8)
+        self.encodings = normalize_encodings(encodings)
+        # Порядок чтения найденных файлов и подсказки ядру о чтении (см. disk_io)
+        self.io_order = io_order
+        self.scanner = FileScanner(self.keywords, match_type, skip_binary, self.text_cache, pattern_mode,
+                                   self.encodings, cache_hints)
+        # Пул обработчиков содержимого
+        self.workers = workers or os.cpu_count() or 4
+        self.pool_type = pool_type
+        self.max_bytes_in_flight = max_in_flight_mb * 1024 * 1024
+        self.bytes_in_flight = 0
+        # Ранжирование: в памяти только top_k лучших файлов, они выдаются в конце
+        # поиска по убыванию оценки (0 - без ранжирования, в порядке обхода)
+        self.top_results = None
+        if top_k and self.keywords and not duplicates:
+            self.top_results = TopResults(top_k, len(self.scanner.matcher.keywords))
+        # Индекс терминов для повторных поисков. Индекс не хранит число
+        # вхождений, поэтому при ранжировании файлы читаются всегда. Термины
+        # индекса собраны из UTF-8, поэтому при поиске в других кодировках
+        # индекс не используется
+        self.use_index = use_index and self.top_results is None and not self.encodings and not duplicates
+        # Поиск по имени или пути файла (подстрока или шаблон). Без ключевых
+        # слов содержимое файлов не открывается
+        self.name_pattern = NamePattern(name_pattern) if name_pattern.strip() else None
+        # При поиске по имени вместо индекса терминов - триграммный индекс путей.
+        # Правила .gitignore применяются только при обходе
+        self.use_path_index = self.use_index and self.name_pattern is not None and not use_gitignore
+        if self.name_pattern is not None:
+            self.use_index = False
+        self.index = None
+        self.index_query = None
+        self.seen_ids = set()
+        self.index_watcher = index_watcher
+        # Обработчики событий: on_progress(snapshot), on_match(match)
+        self.on_progress = None
+        self.on_match = None
+        # Консольной версии не нужно хранить все результаты в памяти
+        self.keep_results = keep_results
+        # Время по этапам поиска
+        self.timings = StageTimings()
+        # Отчёт профилировщика (None - профилирование отключено)
+        self.profile_path = profile_path
+        self.profiler = None
+        # Потоковая выгрузка найденных файлов: пишется во время поиска,
+        # в памяти держатся не все результаты
+        self.export_path = export_path
+        self.export_format = export_format_for(export_path, export_format) if export_path else None
+        self.export = None
+        # Поиск дубликатов вместо поиска по содержимому: ключевые слова не
+        # учитываются, найденные файлы - копии с номером группы
+        self.duplicates = duplicates
+        self.duplicate_groups = 0
+        # Обход папок: стек необойдённых папок и найденные, но ещё не
+        # проверенные файлы - по ним поиск продолжается после остановки
+        self.stack = []
+        self.unfinished = set()
+        # Журнал для продолжения поиска
+        self.journal = None
+        self.resume_state = None
+        self.last_checkpoint = 0.0
+        # Нормализованные параметры запроса: по ним находятся журнал и кэш результатов
+        self.query_params = {
+            "path": os.path.abspath(search_path),
+            "extensions": self.extensions,
+            "keywords": self.keywords,
+            "match_type": match_type,
+            "pattern_mode": pattern_mode,
+            "max_size_bytes": self.max_size_bytes,
+            "skip_binary": skip_binary,
+            "exclude": exclude,
+            "include": include,
+            "use_gitignore": use_gitignore,
+            "encodings": self.encodings,
+            "name_pattern": name_pattern,
+        }
+        # Результаты видны только после обхода у ранжирования, дубликатов и
+        # поиска по индексу - им журнал и кэш результатов не нужны
+        walk_only = self.top_results is None and not duplicates and not self.use_index and not self.use_path_index
+        if (checkpoint or resume) and walk_only:
+            self.journal = SearchJournal(self.query_params)
+            if resume:
+                self.resume_state = self.journal.load()
+        # Кэш результатов повторяющихся запросов: неизменённые папки не читаются
+        # заново, неизменённые файлы не проверяются. Открывается в потоке поиска
+        self.use_query_cache = query_cache and walk_only and bool(self.keywords)
+        self.query_cache = None
+        # Путь -> (размер, mtime, ответ) для найденных при обходе файлов из кэша
+        self.cached_verdicts = {}
+
+    def normalize_extensions(self, extensions):
+        normalized = []
+        for ext in extensions.split(','):
+            ext = ext.strip().lower()
+            if not ext:
+                continue
+            if not ext.startswith('.'):
+                ext = '.' + ext
+            normalized.append(ext)
+        return normalized
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self):
+        if self.export_path:
+            columns = ["path", "filename", "size", "mtime"]
+            if self.top_results is not None:
+                columns.append("score")
+            if self.duplicates:
+                columns.append("group")
+            self.export = open_export(self.export_path, self.export_format, columns)
+        try:
+            return self.run_search()
+        finally:
+            if self.export is not None:
+                self.export.close()
+                self.export = None
+
+    def run_search(self):
+        # Обход и поиск выполняются за один проход
+        if self.profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        try:
+            if self.duplicates:
+                self.find_duplicates(self.search_path)
+            else:
+                if self.journal is not None:
+                    self.open_journal()
+                completed = False
+                try:
+                    self.search_files(self.search_path)
+                    completed = self.is_running
+                finally:
+                    if self.journal is not None:
+                        self.close_journal(completed)
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+                self.write_profile()
+        if self.top_results is not None:
+            self.publish_ranked()
+        self.report_progress(force=True)
+        return self.results
+
+    def open_journal(self):
+        # Продолжение: найденные ранее файлы выдаются сразу, счётчики и
+        # очередь обхода восстанавливаются
+        state = self.resume_state
+        matches = self.journal.load_matches(state["matches_offset"]) if state is not None else []
+        self.journal.open(resume=state is not None)
+        self.last_checkpoint = time.monotonic()
+        if state is None:
+            return
+        for match in matches:
+            self.emit(match)
+        for name in ("processed_files", "processed_bytes", "matches_found",
+                     "candidates_found", "dirs_found", "dirs_scanned"):
+            setattr(self, name, state[name])
+
+    def close_journal(self, completed):
+        if completed:
+            # Поиск дошёл до конца - продолжать нечего
+            self.journal.remove()
+        else:
+            self.save_checkpoint()
+            self.journal.close()
+
+    def save_checkpoint(self):
+        self.last_checkpoint = time.monotonic()
+        self.journal.save({
+            "stack": [[dir_path, rel_dir] for dir_path, rel_dir, _ in self.stack],
+            "unfinished": sorted(self.unfinished),
+            "processed_files": self.processed_files,
+            "processed_bytes": self.processed_bytes,
+            "matches_found": self.matches_found,
+            "candidates_found": self.candidates_found,
+            "dirs_found": self.dirs_found,
+            "dirs_scanned": self.dirs_scanned,
+        })
+
+    def filter_for(self, rel_dir):
+        # Фильтр для папки из сохранённого стека: правила .gitignore всех
+        # папок выше неё (свой .gitignore папка добавит при обходе)
+        path_filter = self.path_filter
+        if not path_filter.use_gitignore or not rel_dir:
+            return path_filter
+        current, rel = self.search_path, ''
+        path_filter = path_filter.enter(current, rel)
+        for part in rel_dir.split('/')[:-1]:
+            current = os.path.join(current, part)
+            rel = rel + '/' + part if rel else part
+            path_filter = path_filter.enter(current, rel)
+        return path_filter
+
+    def iter_resumed(self):
+        # Файлы, начатые до остановки: проверяются первыми
+        for file_path in self.resume_state["unfinished"]:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            self.unfinished.add(file_path)
+            yield file_path, os.path.basename(file_path), st
+
+    def publish_ranked(self):
+        for match in self.top_results.ranked():
+            self.emit(match)
+
+    def emit(self, match):
+        # Найденный файл - в результаты, обработчику и в выгрузку
+        if self.keep_results:
+            self.results.append(match)
+        if self.export is not None:
+            self.export.write(match)
+        if self.on_match is not None:
+            self.on_match(match)
+
+    def write_profile(self):
+        with open(self.profile_path, 'w', encoding='utf-8') as f:
+            f.write(f"Этапы поиска: {self.timings.summary()}\n\n")
+            stats = pstats.Stats(self.profiler, stream=f)
+            stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+
+    def iter_candidates(self, path):
+        # Однопроходный обход через os.scandir: stat берётся из DirEntry,
+        # скрытые и исключённые папки отсекаются сразу и не обходятся.
+        # В стеке - (папка, путь относительно папки поиска, фильтр папки)
+        filtering = self.path_filter.is_active()
+        # Правила .gitignore могут измениться без изменения mtime папки,
+        # поэтому с ними папки из кэша не берутся
+        cached_listings = self.query_cache is not None and not self.path_filter.use_gitignore
+        if self.resume_state is not None:
+            stack = self.stack = [
+                (dir_path, rel_dir, self.filter_for(rel_dir)) for dir_path, rel_dir in self.resume_state["stack"]
+            ]
+            yield from self.iter_resumed()
+        else:
+            stack = self.stack = [(path, '', self.path_filter)]
+            self.dirs_found = 1
+            self.dirs_scanned = 0
+        while stack:
+            if not self.is_running:
+                return
+            current, rel_dir, path_filter = stack.pop()
+            start = clock()
+            listing = dir_mtime = None
+            try:
+                if cached_listings:
+                    dir_mtime = os.stat(current).st_mtime_ns
+                    listing = self.query_cache.listing(current, dir_mtime)
+                if listing is None:
+                    with os.scandir(current) as it:
+                        entries = list(it)
+            except OSError:
+                self.dirs_scanned += 1
+                continue
+            if filtering:
+                path_filter = path_filter.enter(current, rel_dir)
+
+            if listing is not None:
+                subdirs, names, candidates, stat_time = self.read_listing(current, rel_dir, path_filter, *listing)
+            else:
+                subdirs, names, candidates, stat_time = self.read_entries(entries, rel_dir, path_filter, filtering)
+                if dir_mtime is not None:
+                    self.query_cache.record_listing(current, dir_mtime, [subdir[0] for subdir in subdirs], names)
+
+            self.timings.add("traverse", clock() - start - stat_time)
+            if names:
+                self.timings.add("stat", stat_time, len(names))
+            if self.query_cache is not None and candidates:
+                verdicts = self.query_cache.verdicts(current)
+                for candidate in candidates:
+                    verdict = verdicts.get(candidate[1])
+                    if verdict is not None:
+                        self.cached_verdicts[candidate[0]] = verdict
+
+            # Порядок обхода как у os.walk: сначала файлы папки, затем подпапки
+            stack.extend(reversed(subdirs))
+            self.dirs_found += len(subdirs)
+            self.dirs_scanned += 1
+            self.candidates_found += len(candidates)
+            if self.journal is not None:
+                self.unfinished.update(candidate[0] for candidate in candidates)
+            for candidate in candidates:
+                yield candidate
+
+    def read_entries(self, entries, rel_dir, path_filter, filtering):
+        # Подпапки, имена подходящих файлов (до проверки размера) и кандидаты
+        subdirs = []
+        names = []
+        candidates = []
+        stat_time = 0.0
+        for entry in entries:
+            name = entry.name
+            # Пропускаем скрытые файлы/папки
+            if name.startswith('.'):
+                continue
+            rel_path = rel_dir + '/' + name if rel_dir else name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not (filtering and path_filter.excludes_dir(rel_path)):
+                        subdirs.append((entry.path, rel_path, path_filter))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in self.extensions:
+                continue
+            if filtering and path_filter.excludes_file(rel_path):
+                continue
+            if self.name_pattern is not None and not self.name_pattern.matches(rel_path):
+                continue
+            names.append(name)
+            stat_start = clock()
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            finally:
+                stat_time += clock() - stat_start
+            # Пропускаем большие файлы
+            if st.st_size > self.max_size_bytes:
+                continue
+            candidates.append((entry.path, name, st))
+        return subdirs, names, candidates, stat_time
+
+    def read_listing(self, current, rel_dir, path_filter, subdir_names, names):
+        # То же по сохранённому списку неизменённой папки: читается только stat файлов
+        subdirs = []
+        for name in subdir_names:
+            subdirs.append((os.path.join(current, name), rel_dir + '/' + name if rel_dir else name, path_filter))
+        subdirs.sort(key=lambda subdir: subdir[0])
+        candidates = []
+        stat_time = 0.0
+        for name in sorted(names):
+            file_path = os.path.join(current, name)
+            stat_start = clock()
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            finally:
+                stat_time += clock() - stat_start
+            if st.st_size > self.max_size_bytes:
+                continue
+            candidates.append((file_path, name, st))
+        return subdirs, names, candidates, stat_time
+
+    def estimate_total(self):
+        # Текущая оценка общего числа файлов: найденные кандидаты плюс
+        # среднее число кандидатов на папку для ещё не открытых папок
+        if self.dirs_scanned == 0:
+            return max(self.candidates_found, 1)
+        per_dir = self.candidates_found / self.dirs_scanned
+        pending = self.dirs_found - self.dirs_scanned
+        return max(self.candidates_found + int(per_dir * pending), self.processed_files, 1)
+
+    def create_pool(self):
+        # Потоки - для чтения с диска, процессы - для тяжёлого декодирования и сопоставления
+        if self.pool_type == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_process_scanner,
+                initargs=(self.scanner,)
+            )
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def submit_task(self, pool, task, file_path, st):
+        # task: "scan" - проверка содержимого, "index" - проверка с обновлением индекса
+        # Результат задачи - (ответ, время этапов)
+        func = getattr(self.scanner, task)
+        if self.profiler is not None:
+            return self.run_now(func, file_path, st)
+        if self.pool_type == "process":
+            func = {"index": index_in_process, "rank": rank_in_process}.get(task, scan_in_process)
+            return pool.submit(func, file_path, st)
+        return pool.submit(run_timed, func, file_path, st)
+
+    def run_now(self, func, file_path, st):
+        # При профилировании задачи выполняются в текущем потоке,
+        # иначе работа обработчиков не попадёт в отчёт
+        future = Future()
+        try:
+            future.set_result(run_timed(func, file_path, st))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def open_index(self, path):
+        self.index = SearchIndex(path)
+        self.index_query = self.index.query(self.keywords, self.match_type, self.skip_binary, self.pattern_mode)
+        self.seen_ids = set()
+
+    def check_index(self, file_path, st):
+        # Возвращает (ответ по индексу или None, задача для пула)
+        entry = self.index.lookup(file_path)
+        if not self.index.is_fresh(entry, st):
+            return None, "index"
+        self.seen_ids.add(entry.id)
+        return self.index_query.evaluate(entry), "scan"
+
+    def index_is_watched(self):
+        # Индекс поддерживается наблюдателем в актуальном состоянии - обход не нужен.
+        # Исключения применяются при обходе, поэтому с ними обход обязателен
+        watcher = self.index_watcher
+        return (
+            watcher is not None
+            and not self.path_filter.is_active()
+            and watcher.root == os.path.abspath(self.search_path)
+            and watcher.covers(self.extensions, self.max_size_bytes)
+        )
+
+    def submit(self, pool, pending, task, file_path, file, st):
+        # Ограничиваем объём данных и число задач в очереди пула
+        while pending and (
+            len(pending) >= self.workers * 4
+            or self.bytes_in_flight + st.st_size > self.max_bytes_in_flight
+        ):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            self.collect_results(done, pending)
+            if not self.is_running:
+                return
+
+        future = self.submit_task(pool, task, file_path, st)
+        pending[future] = (task, file_path, file, st)
+        self.bytes_in_flight += st.st_size
+
+    def search_tree(self, path, pool, pending):
+        # На дисках с механикой чтение в порядке размещения файлов вместо
+        # порядка обхода сокращает перемещения головок
+        for file_path, file, st in iter_ordered(self.iter_candidates(path), self.io_order):
+            if not self.is_running:
+                return
+
+            if self.name_pattern is not None and not self.keywords:
+                # Файл подходит по имени, содержимое не проверяется
+                self.file_done(file_path, file, st, True)
+                continue
+
+            if self.cached_verdicts:
+                cached = self.cached_verdicts.pop(file_path, None)
+                if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+                    # Файл не изменился - ответ из кэша результатов
+                    self.file_done(file_path, file, st, cached[2])
+                    continue
+
+            task = "scan" if self.top_results is None else "rank"
+            if self.index is not None:
+                # Неизменённые файлы проверяются по индексу без чтения
+                start = clock()
+                verdict, task = self.check_index(file_path, st)
+                self.timings.add("index", clock() - start)
+                if verdict is not None:
+                    self.file_done(file_path, file, st, verdict)
+                    continue
+
+            self.submit(pool, pending, task, file_path, file, st)
+
+    def search_indexed(self, pool, pending):
+        # Поиск только по индексу: файлы берутся из индекса, на диск идём лишь
+        # за теми, для которых индекс не даёт точного ответа
+        if not self.index_watcher.flush(lambda: self.is_running):
+            return
+        entries = self.index.files_for_query(self.extensions, self.max_size_bytes)
+        self.candidates_found = len(entries)
+        self.dirs_found = self.dirs_scanned = 1
+        for file_path, entry in entries:
+            if not self.is_running:
+                return
+
+            file = os.path.basename(file_path)
+            start = clock()
+            verdict = self.index_query.evaluate(entry)
+            self.timings.add("index", clock() - start)
+            if verdict is not None:
+                self.file_done(file_path, file, entry, verdict)
+            else:
+                self.submit(pool, pending, "scan", file_path, file, entry)
+
+    def iter_all_files(self, path):
+        # Все файлы папки для индекса путей: (путь относительно папки, stat).
+        # Фильтры поиска не применяются - индекс общий для любых запросов
+        stack = [(path, '')]
+        while stack and self.is_running:
+            current, rel_dir = stack.pop()
+            start = clock()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            files = []
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                rel_path = rel_dir + '/' + entry.name if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, rel_path))
+                    elif entry.is_file():
+                        files.append((rel_path, entry.stat()))
+                except OSError:
+                    continue
+            self.timings.add("traverse", clock() - start)
+            self.current_dir = current
+            self.report_progress()
+            yield from files
+
+    def search_path_index(self, path, pool, pending):
+        # Поиск по имени через индекс путей. Индекс, который не поддерживает
+        # наблюдатель за папкой, перестраивается полным обходом по возрасту,
+        # как updatedb у locate
+        watcher = self.index_watcher
+        if watcher is not None and watcher.root != os.path.abspath(path):
+            watcher = None
+        index = PathIndex(path)
+        try:
+            if watcher is not None:
+                stale = not watcher.tracks_paths_since(index.built_at())
+            else:
+                stale = not index.is_fresh()
+            if stale:
+                index.rebuild(self.iter_all_files(path))
+                if not self.is_running:
+                    return
+            elif watcher is not None and not watcher.flush(lambda: self.is_running):
+                return
+            start = clock()
+            found = index.search(self.name_pattern)
+            self.timings.add("index", clock() - start)
+        finally:
+            index.close()
+
+        # Индекс мог отстать от диска: каждый кандидат проверяется заново,
+        # исчезнувшие отбрасываются. Путь строится от папки в том виде, в
+        # котором её передали, как при обходе
+        filtering = self.path_filter.is_active()
+        candidates = []
+        start = clock()
+        for rel_path in found:
+            if (
+                os.path.splitext(rel_path)[1].lower() not in self.extensions
+                or (filtering and self.path_filter.excludes_path(rel_path))
+            ):
+                continue
+            file_path = os.path.join(path, *rel_path.split('/'))
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode) and st.st_size <= self.max_size_bytes:
+                candidates.append((file_path, rel_path, st))
+        if found:
+            self.timings.add("stat", clock() - start, len(found))
+        self.candidates_found = len(candidates)
+        self.dirs_found = self.dirs_scanned = 1
+        for file_path, rel_path, st in candidates:
+            if not self.is_running:
+                return
+            file = rel_path.rpartition('/')[2]
+            if self.keywords:
+                self.submit(pool, pending, "scan" if self.top_results is None else "rank", file_path, file, st)
+            else:
+                self.file_done(file_path, file, st, True)
+
+    def search_files(self, path):
+        pool = self.create_pool()
+        pending = {}
+        self.bytes_in_flight = 0
+        watched = False
+        # Обход с исключениями видит не все файлы - по нему нельзя чистить индекс
+        full_walk = not self.path_filter.is_active() and self.resume_state is None
+        if self.use_query_cache:
+            self.query_cache = QueryCache(self.query_params)
+        if self.use_index:
+            self.open_index(path)
+            watched = self.index_is_watched()
+            if not watched and full_walk and self.index_watcher is not None:
+                self.index_watcher.begin_sync(self.extensions, self.max_size_bytes)
+        try:
+            if watched:
+                self.search_indexed(pool, pending)
+            elif self.use_path_index:
+                self.search_path_index(path, pool, pending)
+            else:
+                self.search_tree(path, pool, pending)
+
+            while pending and self.is_running:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                self.collect_results(done, pending)
+
+            # Обход завершён полностью - удаляем из индекса исчезнувшие файлы
+            if self.index is not None and not watched and full_walk and self.is_running:
+                self.index.remove_missing(self.seen_ids, self.extensions)
+                if self.index_watcher is not None:
+                    self.index_watcher.end_sync()
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+            if self.query_cache is not None:
+                self.query_cache.close()
+                self.query_cache = None
+                self.cached_verdicts = {}
+
+    def find_duplicates(self, path):
+        # Этапы: группы по размеру из stat обхода, затем хэш первого и
+        # последнего блока в группах одного размера, затем полный хэш
+        # оставшихся. Файлы с уникальным размером не читаются вовсе
+        by_size = defaultdict(list)
+        inodes = set()
+        for file_path, file, st in self.iter_candidates(path):
+            if not self.is_running:
+                return
+            # Жёсткие ссылки на один файл - не копии
+            inode = (st.st_dev, st.st_ino)
+            if st.st_size == 0 or inode in inodes:
+                self.file_done(file_path, file, st, False)
+                continue
+            inodes.add(inode)
+            by_size[st.st_size].append((file_path, file, st))
+            self.current_dir = os.path.dirname(file_path)
+            self.report_progress()
+
+        groups = []
+        for files in by_size.values():
+            if len(files) > 1:
+                groups.append(files)
+            else:
+                self.file_done(*files[0], False)
+        del by_size
+
+        pool = self.create_pool()
+        try:
+            candidates = iter_ordered([item for files in groups for item in files], self.io_order)
+            groups = split_groups(self.hash_files(pool, edge_digest, candidates))
+            # Файлы до двух блоков уже сравнены целиком
+            final = [files for files in groups if edges_cover_file(files[0][2].st_size)]
+            candidates = iter_ordered(
+                [item for files in groups if not edges_cover_file(files[0][2].st_size) for item in files], self.io_order
+            )
+            final += split_groups(self.hash_files(pool, full_digest, candidates))
+        finally:
+            pool.shutdown(wait=True)
+        if not self.is_running:
+            return
+
+        final.sort(key=lambda files: -files[0][2].st_size)
+        for files in final:
+            self.duplicate_groups += 1
+            for file_path, file, st in files:
+                self.file_done(file_path, file, st, True, group=self.duplicate_groups)
+
+    def hash_files(self, pool, func, items):
+        # {(размер, хэш): [(путь, имя, stat), ...]}. Файл, оставшийся без пары,
+        # на этом этапе считается обработанным
+        groups = defaultdict(list)
+        pending = {}
+        limit = self.workers * 4
+
+        def collect(done):
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    (digest, size), timings = future.result()
+                    self.timings.merge(timings)
+                except Exception:
+                    # Файл недоступен - не дубликат
+                    self.file_done(*item, False)
+                    continue
+                self.processed_bytes += size
+                groups[(item[2].st_size, digest)].append(item)
+                self.report_progress()
+
+        try:
+            for item in items:
+                if not self.is_running:
+                    return groups
+                while len(pending) >= limit:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if self.profiler is not None:
+                    future = self.run_now(func, item[0], item[2])
+                else:
+                    future = pool.submit(run_timed, func, item[0], item[2])
+                pending[future] = item
+            while pending and self.is_running:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            for future in pending:
+                future.cancel()
+
+        for key, files in list(groups.items()):
+            if len(files) == 1:
+                self.file_done(*files[0], False)
+                del groups[key]
+        return groups
+
+    def collect_results(self, done, pending):
+        for future in done:
+            task, file_path, file, st = pending.pop(future)
+            self.bytes_in_flight -= st.st_size
+
+            try:
+                result, timings = future.result()
+                self.timings.merge(timings)
+            except Exception:
+                result = None
+
+            ranking = None
+            if task == "index" and result is not None:
+                found, binary, exact, terms = result
+                start = clock()
+                self.seen_ids.add(self.index.update(file_path, st, binary, exact, terms))
+                self.timings.add("index", clock() - start)
+            elif task == "rank" and result is not None:
+                found, counts, length = result
+                ranking = (counts, length)
+                self.top_results.add_document(counts, length)
+            else:
+                found = result
+                if self.query_cache is not None and result is not None:
+                    self.query_cache.record(file_path, st, bool(found))
+            self.file_done(file_path, file, st, bool(found), ranking)
+
+    def file_done(self, file_path, file, st, found, ranking=None, group=None):
+        self.processed_files += 1
+        if not self.duplicates:
+            # При поиске дубликатов учитываются только действительно прочитанные байты
+            self.processed_bytes += st.st_size
+        self.current_dir = os.path.dirname(file_path)
+        if found:
+            self.add_match(file_path, file, st, ranking, group)
+        if self.journal is not None:
+            self.unfinished.discard(file_path)
+            if time.monotonic() - self.last_checkpoint >= CHECKPOINT_INTERVAL:
+                self.save_checkpoint()
+        self.report_progress()
+
+    def report_progress(self, force=False):
+        # Вместо события на каждый файл - сводка с накопленными счётчиками
+        # с фиксированной частотой, независимо от скорости обработки
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        self.file_count = self.estimate_total()
+        self.on_progress({
+            "progress": min(int((self.processed_files / self.file_count) * 100), 100),
+            "files": self.processed_files,
+            "total": self.file_count,
+            "bytes": self.processed_bytes,
+            "matches": self.matches_found,
+            "directory": self.current_dir,
+            "stages": self.timings.summary(limit=4)
+        })
+
+    def add_match(self, file_path, file, st, ranking=None, group=None):
+        match = {
+            "file_path": file_path,
+            "filename": file,
+            # Форматируем размер файла
+            "size": self.format_size(st.st_size),
+            # Получаем дату изменения
+            "modified": format_modified(st.st_mtime),
+            # Исходные значения для экспорта
+            "size_bytes": st.st_size,
+            "mtime": st.st_mtime
+        }
+        if group is not None:
+            # Номер группы одинаковых файлов
+            match["group"] = group
+        self.matches_found += 1
+        if ranking is not None:
+            # Выдаются в конце поиска, в порядке оценки
+            self.top_results.offer(match, *ranking)
+            return
+        if self.journal is not None:
+            self.journal.add_match(match)
+        self.emit(match)
+
+    def format_size(self, size):
+        return format_size(size)
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+
+from matcher import required_literal
+from scanner import TERM_RE
+from storage import data_dir, root_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    binary INTEGER NOT NULL,
+    exact INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (term_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+# Версия формата индекса. Меняется, когда меняется способ извлечения терминов,
+# при несовпадении индекс строится заново
+INDEX_VERSION = 2
+
+# Сколько файлов записывать в одной транзакции
+COMMIT_EVERY = 500
+
+
+class IndexedFile:
+    # Запись индекса. Поля названы как у os.stat_result, чтобы запись
+    # можно было передавать туда же, куда передаётся результат stat
+    __slots__ = ("id", "st_size", "st_mtime_ns", "binary", "exact")
+
+    def __init__(self, id, size, mtime_ns, binary, exact):
+        self.id = id
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+        self.binary = binary
+        self.exact = exact
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns / 1e9
+
+
+class SearchIndex:
+    # Инвертированный индекс терминов для одной папки поиска.
+    # Файл считается актуальным, пока совпадают его размер и время изменения
+
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(data_dir("index"), root_key(root) + ".sqlite")
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS terms; DROP TABLE IF EXISTS files;"
+            )
+            self.conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.conn.executescript(SCHEMA)
+        self.term_ids = {}
+        self.pending_writes = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def lookup(self, file_path):
+        row = self.conn.execute(
+            "SELECT id, size, mtime_ns, binary, exact FROM files WHERE path = ?", (file_path,)
+        ).fetchone()
+        return IndexedFile(*row) if row else None
+
+    def is_fresh(self, entry, st):
+        return entry is not None and entry.st_size == st.st_size and entry.st_mtime_ns == st.st_mtime_ns
+
+    def term_id(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO terms (term) VALUES (?)", (term,))
+            term_id = self.conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()[0]
+            self.term_ids[term] = term_id
+        return term_id
+
+    def update(self, file_path, st, binary, exact, terms):
+        # Запись (или перезапись) файла и его терминов, возвращает id файла
+        conn = self.conn
+        conn.execute(
+            "INSERT INTO files (path, size, mtime_ns, binary, exact) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+            "binary = excluded.binary, exact = excluded.exact",
+            (file_path, st.st_size, st.st_mtime_ns, int(binary), int(exact))
+        )
+        file_id = conn.execute("SELECT id FROM files WHERE path = ?", (file_path,)).fetchone()[0]
+        conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO postings (term_id, file_id) VALUES (?, ?)",
+            ((self.term_id(term), file_id) for term in terms)
+        )
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            conn.commit()
+            self.pending_writes = 0
+        return file_id
+
+    def remove(self, file_path):
+        entry = self.lookup(file_path)
+        if entry is None:
+            return
+        self.conn.execute("DELETE FROM postings WHERE file_id = ?", (entry.id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (entry.id,))
+
+    def remove_tree(self, dir_path):
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        # Диапазон путей с общим префиксом: [prefix, prefix + максимальный символ)
+        rows = self.conn.execute(
+            "SELECT id FROM files WHERE path >= ? AND path < ?", (prefix, prefix + "\U0010ffff")
+        ).fetchall()
+        for (file_id,) in rows:
+            self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+            self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def files_for_query(self, extensions, max_size_bytes):
+        # Все файлы индекса, подходящие под расширения и размер, без обращения к диску
+        return [
+            (path, IndexedFile(file_id, size, mtime_ns, binary, exact))
+            for file_id, path, size, mtime_ns, binary, exact in self.conn.execute(
+                "SELECT id, path, size, mtime_ns, binary, exact FROM files WHERE size <= ?",
+                (max_size_bytes,)
+            )
+            if os.path.splitext(path)[1].lower() in extensions
+        ]
+
+    def remove_missing(self, seen_ids, extensions):
+        # Удаляем файлы, которые должны были встретиться при обходе, но не встретились
+        stale = [
+            file_id for file_id, path in self.conn.execute("SELECT id, path FROM files")
+            if file_id not in seen_ids and os.path.splitext(path)[1].lower() in extensions
+        ]
+        for file_id in stale:
+            self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+            self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self.conn.commit()
+
+    def files_with_substring(self, part):
+        # Файлы, в которых есть термин, содержащий part
+        return {
+            file_id for (file_id,) in self.conn.execute(
+                "SELECT DISTINCT p.file_id FROM terms t JOIN postings p ON p.term_id = t.id "
+                "WHERE instr(t.term, ?) > 0", (part,)
+            )
+        }
+
+    def files_with_term(self, term):
+        # Файлы, в которых есть термин term целиком
+        return {
+            file_id for (file_id,) in self.conn.execute(
+                "SELECT p.file_id FROM terms t JOIN postings p ON p.term_id = t.id "
+                "WHERE t.term = ?", (term,)
+            )
+        }
+
+    def query(self, keywords, match_type, skip_binary, pattern_mode="text"):
+        return IndexQuery(self, keywords, match_type, skip_binary, pattern_mode)
+
+
+class IndexQuery:
+    # Ответ на запрос по индексу. Слово из одних буквенно-цифровых символов
+    # встречается в тексте тогда и только тогда, когда оно входит в один из
+    # терминов, поэтому такие слова проверяются по индексу точно. Для остальных
+    # индекс лишь сужает круг файлов, а найденные кандидаты проверяются чтением.
+    # Целое слово - это термин целиком, для регулярного выражения круг файлов
+    # сужается по его обязательной подстроке
+    YES, NO, MAYBE = 1, 0, None
+
+    def __init__(self, index, keywords, match_type, skip_binary, pattern_mode="text"):
+        self.match_type = match_type
+        self.skip_binary = skip_binary
+        self.keywords = []
+        for keyword in keywords:
+            if pattern_mode == "regex":
+                keyword = required_literal(keyword)
+                parts = TERM_RE.findall(keyword)
+                exact = False
+            else:
+                parts = TERM_RE.findall(keyword)
+                exact = parts == [keyword]
+            # Части целого слова - законченные термины, в остальных режимах
+            # часть может быть куском более длинного термина
+            lookup = index.files_with_term if pattern_mode == "word" else index.files_with_substring
+            candidates = None
+            for part in parts:
+                ids = lookup(part)
+                candidates = ids if candidates is None else candidates & ids
+            self.keywords.append((exact, candidates))
+
+    def keyword_state(self, exact, ids, file_id):
+        if exact:
+            return self.YES if file_id in ids else self.NO
+        if ids is not None and file_id not in ids:
+            return self.NO
+        return self.MAYBE
+
+    def evaluate(self, entry):
+        # True/False - ответ по индексу, None - файл нужно прочитать
+        if entry.binary and self.skip_binary:
+            return False
+        if not self.keywords:
+            return True
+        if not entry.exact:
+            return None
+
+        states = [self.keyword_state(exact, ids, entry.id) for exact, ids in self.keywords]
+        if self.match_type == "any":
+            if self.YES in states:
+                return True
+            return None if self.MAYBE in states else False
+        if self.NO in states:
+            return False
+        return None if self.MAYBE in states else True
@@ -0,0 +1,110 @@
+import re
+import codecs
+
+from extractors import get_extractor
+from matcher import split_keywords
+from byte_search import SNIFF_SIZE, detect_encodings
+from scanner import read_chunks
+
+# Сколько фрагментов искать в файле и сколько символов показывать вокруг совпадения
+MAX_SNIPPETS = 3
+CONTEXT_BEFORE = 40
+CONTEXT_AFTER = 80
+# Строка длиннее этого (минифицированные файлы) проверяется частями
+MAX_LINE_CHARS = 1024 * 1024
+
+
+def snippet_pattern(keywords, pattern_mode="text"):
+    # Одно выражение для поиска любого из ключевых слов в строке
+    if pattern_mode == "word":
+        sources = [r'(?<!\w)' + re.escape(kw) + r'(?!\w)' for kw in keywords]
+    elif pattern_mode == "regex":
+        sources = [f'(?:{kw})' for kw in keywords]
+    else:
+        sources = [re.escape(kw) for kw in keywords]
+    try:
+        return re.compile('|'.join(sources), re.IGNORECASE | re.MULTILINE)
+    except re.error:
+        # Выражения со ссылками на группы не объединяются - берём первое
+        return re.compile(sources[0], re.IGNORECASE | re.MULTILINE)
+
+
+class SnippetFinder:
+    # Фрагменты текста вокруг совпадений с номерами строк. Вычисляются по
+    # запросу для отдельных файлов (видимых строк таблицы), поэтому основной
+    # поиск по-прежнему только отвечает «да/нет»
+
+    def __init__(self, keywords, pattern_mode="text", encodings=()):
+        if isinstance(keywords, str):
+            keywords = split_keywords(keywords, pattern_mode)
+        self.pattern = snippet_pattern(keywords, pattern_mode) if keywords else None
+        # Кодировки текстовых файлов (пусто - только UTF-8)
+        self.encodings = list(encodings)
+
+    def file_encodings(self, f, extractor):
+        if extractor is not None or not self.encodings:
+            return ['utf-8']
+        head = f.read(SNIFF_SIZE)
+        f.seek(0)
+        return detect_encodings(head, self.encodings) or self.encodings
+
+    def iter_lines(self, f, extractor, encoding='utf-8'):
+        # Строки текста файла с номерами (у документов - строки извлечённого текста)
+        if extractor is not None:
+            texts = extractor(f)
+        else:
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            texts = (decoder.decode(chunk) for chunk in read_chunks(f))
+        number = 1
+        # Метка BOM в начале файла - не часть текста
+        carry = None
+        for text in texts:
+            lines = (text.lstrip('\ufeff') if carry is None else carry + text).split('\n')
+            carry = lines.pop()
+            for line in lines:
+                yield number, line
+                number += 1
+            if len(carry) > MAX_LINE_CHARS:
+                yield number, carry
+                carry = ''
+        if carry:
+            yield number, carry
+
+    def find(self, file_path, limit=MAX_SNIPPETS):
+        # [(номер строки, фрагмент), ...]
+        if self.pattern is None:
+            return []
+        snippets = []
+        extractor = get_extractor(file_path)
+        with open(file_path, 'rb') as f:
+            # Если кодировка файла не определена однозначно, пробуем по очереди
+            for encoding in self.file_encodings(f, extractor):
+                f.seek(0)
+                lines = self.iter_lines(f, extractor, encoding)
+                try:
+                    for number, line in lines:
+                        m = self.pattern.search(line)
+                        if m is None:
+                            continue
+                        snippets.append((number, self.cut(line, m.start(), m.end())))
+                        if len(snippets) >= limit:
+                            break
+                finally:
+                    lines.close()
+                if snippets:
+                    break
+        return snippets
+
+    def cut(self, line, start, end):
+        left = max(start - CONTEXT_BEFORE, 0)
+        right = min(end + CONTEXT_AFTER, len(line))
+        text = ' '.join(line[left:right].split())
+        if left > 0:
+            text = '…' + text
+        if right < len(line):
+            text += '…'
+        return text
+
+
+def format_snippets(snippets):
+    return '\n'.join(f"{number}: {text}" for number, text in snippets)
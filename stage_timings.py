@@ -0,0 +1,49 @@
+import time
+
+clock = time.perf_counter
+
+# Этапы поиска в порядке вывода
+STAGES = {
+    "traverse": "обход",
+    "stat": "stat",
+    "index": "индекс",
+    "open": "открытие",
+    "sniff": "проверка на бинарность",
+    "read": "чтение",
+    "decode": "декодирование",
+    "extract": "извлечение текста",
+    "match": "сопоставление",
+    "terms": "сбор терминов",
+    "hash": "хэширование",
+}
+
+
+class StageTimings:
+    # Время и число вызовов по этапам поиска. Время обработчиков складывается,
+    # поэтому при нескольких обработчиках сумма больше общего времени поиска
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(STAGES, 0)
+
+    def add(self, stage, seconds, count=1):
+        self.seconds[stage] += seconds
+        self.counts[stage] += count
+
+    def merge(self, other):
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] += seconds
+            self.counts[stage] += other.counts[stage]
+
+    def snapshot(self):
+        return {
+            stage: {"seconds": round(self.seconds[stage], 4), "count": self.counts[stage]}
+            for stage in STAGES if self.counts[stage]
+        }
+
+    def summary(self, limit=None):
+        # Этапы по убыванию времени: "чтение 1.2 с, сопоставление 0.4 с"
+        stages = sorted((s for s in STAGES if self.counts[s]), key=self.seconds.get, reverse=True)
+        if limit is not None:
+            stages = stages[:limit]
+        return ", ".join(f"{STAGES[s]} {self.seconds[s]:.2f} с" for s in stages)
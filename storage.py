@@ -0,0 +1,22 @@
+import os
+import json
+import hashlib
+
+
+def data_dir(*parts):
+    # Каталог данных приложения: индексы, кэши, журналы поиска.
+    # Переменная XILLEN_DATA_DIR позволяет перенести его (например, на сервере)
+    base = os.environ.get("XILLEN_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".xillen_file_finder")
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def root_key(path):
+    # Имя файла данных для папки поиска
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def query_key(params):
+    # Имя файла данных для параметров поиска (журнал, кэш результатов)
+    return hashlib.sha1(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from byte_search import ByteMatcher, detect_encodings, normalize_encodings
+from scanner import FileScanner
+
+
+def byte_match(keywords, encodings, data, chunk_size=None):
+    matcher = ByteMatcher(keywords, "any", encodings)
+    plan = matcher.plan(detect_encodings(data[:4096], encodings))
+    found, state = 0, b''
+    chunk_size = chunk_size or len(data) or 1
+    for i in range(0, len(data), chunk_size):
+        found, state = matcher.feed(data[i:i + chunk_size], plan, found, state)
+    return matcher.is_match(found)
+
+
+class CaseFoldingTest(unittest.TestCase):
+    # С выбранными кодировками регистр не должен учитываться, как и без них
+
+    def test_ascii_mixed_case(self):
+        self.assertTrue(byte_match(["hello"], ["utf-8", "cp1251"], b"say hELLo there"))
+
+    def test_single_byte_cyrillic_mixed_case(self):
+        for encoding in ("cp1251", "koi8-r"):
+            data = "ПрИвЕт мир".encode(encoding)
+            self.assertTrue(byte_match(["привет"], ["utf-8", "cp1251", "koi8-r"], data), encoding)
+
+    def test_fold_across_chunks(self):
+        data = "xx ПРИ".encode("cp1251") + "вЕТ".encode("cp1251")
+        self.assertTrue(byte_match(["привет"], ["cp1251"], data, chunk_size=5))
+
+    def test_no_false_match(self):
+        self.assertFalse(byte_match(["hello"], ["utf-8", "cp1251"], b"say help there"))
+
+
+class FileScannerEncodingsTest(unittest.TestCase):
+    # Выбор кодировок не должен терять файлы, которые находятся без него
+
+    def scan(self, keywords, encodings, data):
+        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+            f.write(data)
+        try:
+            scanner = FileScanner(keywords, "any", True, encodings=normalize_encodings(encodings))
+            return scanner.scan(f.name, os.stat(f.name))
+        finally:
+            os.remove(f.name)
+
+    def test_utf8_cyrillic_mixed_case(self):
+        data = "Номер: ДоГоВоР 15".encode("utf-8")
+        self.assertTrue(self.scan(["договор"], "", data))
+        self.assertTrue(self.scan(["договор"], "utf-8,cp1251", data))
+        self.assertTrue(self.scan(["договор"], "utf-8,cp1251,koi8-r,utf-16", data))
+
+    def test_utf8_with_ascii_head(self):
+        data = b"x" * 5000 + "ДоГоВоР".encode("utf-8")
+        self.assertTrue(self.scan(["договор"], "utf-8,cp1251", data))
+
+    def test_cp1251_mixed_case_with_utf8_selected(self):
+        data = "Номер: ДоГоВоР 15".encode("cp1251")
+        self.assertTrue(self.scan(["договор"], "utf-8,cp1251", data))
+        self.assertFalse(self.scan(["договор"], "utf-8,koi8-r", data))
+
+    def test_utf16_mixed_case(self):
+        data = "\ufeffHeLLo ДоГоВоР".encode("utf-16-le")
+        self.assertTrue(self.scan(["hello"], "utf-8,utf-16", data))
+        self.assertTrue(self.scan(["договор"], "utf-8,utf-16", data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from matcher import create_matcher, REGEX_MAX_SPAN
+
+
+def feed_fragments(matcher, fragments):
+    found, state = 0, 0
+    for fragment in fragments:
+        found, state = matcher.feed(fragment, found, state)
+    return matcher.is_match(matcher.finish(found, state))
+
+
+def count_fragments(matcher, fragments):
+    counts, state = [0] * len(matcher.keywords), ''
+    for fragment in fragments:
+        counts, state = matcher.count(fragment, counts, state)
+    return matcher.count_finish(counts, state)
+
+
+class FragmentBoundaryTest(unittest.TestCase):
+    # Результат не должен зависеть от того, где текст разрезан на фрагменты
+
+    def assert_same_for_all_splits(self, matcher, text):
+        expected = matcher.matches(text)
+        expected_counts = count_fragments(matcher, [text])
+        for i in range(len(text) + 1):
+            fragments = [text[:i], text[i:]]
+            self.assertEqual(feed_fragments(matcher, fragments), expected, fragments)
+            self.assertEqual(count_fragments(matcher, fragments), expected_counts, fragments)
+        return expected
+
+    def test_word_inside_longer_word(self):
+        matcher = create_matcher(['log'], 'any', 'word')
+        self.assertFalse(self.assert_same_for_all_splits(matcher, "x catalog abbc"))
+        self.assertFalse(feed_fragments(matcher, ["x catalog a", "bbc"]))
+
+    def test_word_found_across_boundary(self):
+        matcher = create_matcher(['log'], 'any', 'word')
+        self.assertTrue(self.assert_same_for_all_splits(matcher, "x catalog log."))
+        self.assertEqual(count_fragments(matcher, ["log cata", "log lo", "g"]), [2])
+
+    def tail_fragments(self, left, tail_text):
+        # Первый фрагмент кончается хвостом, который начинается с tail_text
+        tail = tail_text + " " * (REGEX_MAX_SPAN + 1 - len(tail_text))
+        return ["y" * 10 + left + tail, "z"]
+
+    def test_regex_lookbehind(self):
+        matcher = create_matcher([r'(?<!\w)inv-\d+'], 'any', 'regex')
+        self.assertFalse(self.assert_same_for_all_splits(matcher, "xinv-12 y"))
+        self.assertTrue(self.assert_same_for_all_splits(matcher, "x inv-12 y"))
+        self.assertFalse(feed_fragments(matcher, self.tail_fragments("x", "inv-12")))
+        self.assertTrue(feed_fragments(matcher, self.tail_fragments(" ", "inv-12")))
+
+    def test_regex_line_start_in_long_tail(self):
+        matcher = create_matcher([r'^abc'], 'any', 'regex')
+        self.assertFalse(feed_fragments(matcher, self.tail_fragments("x", "abc")))
+        self.assertTrue(feed_fragments(matcher, self.tail_fragments("\n", "abc")))
+        self.assertEqual(count_fragments(matcher, self.tail_fragments("x", "abc")), [0])
+
+    def test_regex_word_boundary_all_keywords(self):
+        matcher = create_matcher([r'\bcat\b', r'\bdog\b'], 'all', 'regex')
+        self.assertFalse(self.assert_same_for_all_splits(matcher, "bobcat dog"))
+        self.assertTrue(self.assert_same_for_all_splits(matcher, "a cat dog"))
+
+
+if __name__ == "__main__":
+    unittest.main()
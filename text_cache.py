@@ -0,0 +1,101 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+from storage import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+# Текст длиннее этого не кэшируется (символов)
+MAX_ENTRY_CHARS = 16 * 1024 * 1024
+
+
+class TextCache:
+    # Дисковый кэш извлечённого (и приведённого к нижнему регистру) текста
+    # документов. Ключ - путь, размер и время изменения файла (те же данные
+    # доступны и при поиске по индексу, где inode не хранится).
+    # При превышении бюджета удаляются давно не использованные записи (LRU)
+
+    def __init__(self, max_bytes, path=None):
+        self.max_bytes = max_bytes
+        self.path = path or data_dir("text_cache")
+        os.makedirs(self.path, exist_ok=True)
+        self.db_path = os.path.join(self.path, "entries.sqlite")
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        # Соединение на операцию: кэш используется из потоков и процессов пула
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def key(self, file_path, st):
+        raw = "\0".join((file_path, str(st.st_size), str(st.st_mtime_ns)))
+        return hashlib.sha1(raw.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".z")
+
+    def get(self, key):
+        # Возвращает (текст, полный ли текст) или (None, False)
+        with self.connect() as conn:
+            row = conn.execute("SELECT complete FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None, False
+            try:
+                with open(self.entry_path(key), 'rb') as f:
+                    text = zlib.decompress(f.read()).decode('utf-8')
+            except (OSError, zlib.error, UnicodeDecodeError):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None, False
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return text, bool(row[0])
+
+    def put(self, key, text, complete):
+        data = zlib.compress(text.encode('utf-8', 'surrogatepass'), 1)
+        if len(data) > self.max_bytes:
+            return
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, size, complete, last_used) VALUES (?, ?, ?, ?)",
+                (key, len(data), int(complete), time.time())
+            )
+            self.evict(conn)
+
+    def evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Освобождаем с запасом, чтобы не вытеснять по записи на каждое добавление
+        target = self.max_bytes * 0.9
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size